@@ -0,0 +1,86 @@
+"""JWT-аутентификация без запроса пользователя к БД на каждый вызов.
+
+В токен при выдаче кладутся username и версия (ver), вычисленная из
+хэша пароля и флага активности. Пользователь берётся из кэша по id и
+сверяется с версией токена, поэтому после смены пароля или деактивации
+старые токены перестают работать. В кэше лежат только id, username,
+is_active и версия - не хэш пароля. Для действий из stateless_actions
+viewset (публичное чтение) пользователь собирается прямо из токена, без
+проверки версии.
+"""
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from posts.models import User
+
+from .settings import API_AUTH_CACHE_TIMEOUT
+
+VERSION_CLAIM = 'ver'
+USER_CACHE_KEY = 'api:auth:user:{}'
+
+
+def token_version(user):
+    raw = f'{user.password}|{user.is_active}'
+    return salted_hmac('api.token_version', raw).hexdigest()[:16]
+
+
+def forget_user(user_id):
+    cache.delete(USER_CACHE_KEY.format(user_id))
+
+
+class VersionedTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.username
+        token[VERSION_CLAIM] = token_version(user)
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication с пользователем из кэша или из самого токена."""
+
+    def authenticate(self, request):
+        view = request.parser_context.get('view')
+        self.stateless = (
+            request.method in SAFE_METHODS
+            and getattr(view, 'action', None)
+            in getattr(view, 'stateless_actions', ()))
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        version = validated_token.get(VERSION_CLAIM)
+        if version is None:
+            # Токены, выданные до появления версии.
+            return super().get_user(validated_token)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if self.stateless:
+            return User(**{
+                api_settings.USER_ID_FIELD: user_id,
+                'username': validated_token.get('username', ''),
+                'is_active': True,
+            })
+        key = USER_CACHE_KEY.format(user_id)
+        cached = cache.get(key)
+        if cached is not None and cached['version'] == version:
+            return User(**{
+                api_settings.USER_ID_FIELD: user_id,
+                'username': cached['username'],
+                'is_active': cached['is_active'],
+            })
+        user = super().get_user(validated_token)
+        cache.set(key, {
+            'username': user.username,
+            'is_active': user.is_active,
+            'version': token_version(user),
+        }, API_AUTH_CACHE_TIMEOUT)
+        if token_version(user) != version:
+            raise AuthenticationFailed(
+                'Токен выдан до смены пароля или блокировки.',
+                code='token_outdated')
+        return user
@@ -0,0 +1,40 @@
+"""Потоковая выгрузка постов в NDJSON: один JSON-объект на строку."""
+import json
+from itertools import islice
+
+from posts.models import Comment
+
+from .serializers import FastCommentSerializer, FastPostSerializer
+from .settings import API_EXPORT_CHUNK_SIZE
+
+
+def export_posts(posts, comments=False, request=None,
+                 chunk_size=API_EXPORT_CHUNK_SIZE):
+    """Генератор строк NDJSON с постами, по возрастанию pub_date.
+
+    Посты читаются через iterator(), комментарии - одним запросом на
+    пачку из chunk_size постов, так что память не зависит от объёма.
+    """
+    rows = FastPostSerializer.values(
+        posts.order_by('pub_date', 'id')).iterator(chunk_size=chunk_size)
+    while True:
+        items = FastPostSerializer.serialize(
+            islice(rows, chunk_size), request)
+        if not items:
+            return
+        if comments:
+            attach_comments(items, request)
+        for item in items:
+            yield json.dumps(item, ensure_ascii=False) + '\n'
+
+
+def attach_comments(items, request=None):
+    by_post = {item['id']: [] for item in items}
+    for comment in FastCommentSerializer.serialize(
+            FastCommentSerializer.values(
+                Comment.objects.filter(post__in=list(by_post)).order_by(
+                    'post_id', '-created', '-id')),
+            request):
+        by_post[comment['post']].append(comment)
+    for item in items:
+        item['comments'] = by_post[item['id']]
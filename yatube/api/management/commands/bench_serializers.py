@@ -0,0 +1,95 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.serializers import (CommentSerializer, FastCommentSerializer,
+                             FastPostSerializer, PostSerializer)
+from core.db import bulk_batch_size
+from posts.models import Comment, Post, User
+
+SIZES = (100, 1000, 10000)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает PostSerializer и CommentSerializer с быстрой '
+            'сериализацией через values() на 100/1000/10000 строк.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, action='append',
+                            help='Размеры выборки, по умолчанию 100, '
+                                 '1000 и 10000.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        sizes = options['size'] or SIZES
+        report = {}
+        # Недостающие строки создаются на время замера и откатываются.
+        with transaction.atomic():
+            post = self.fill(max(sizes))
+            cases = (
+                ('post', PostSerializer, FastPostSerializer,
+                 Post.objects.select_related('author', 'group').order_by(
+                     '-pub_date', '-id')),
+                ('comment', CommentSerializer, FastCommentSerializer,
+                 post.comments.select_related('author').order_by(
+                     '-created', '-id')),
+            )
+            for name, serializer, fast, queryset in cases:
+                for size in sizes:
+                    report[f'{name}:{size}'] = self.measure(
+                        serializer, fast, queryset[:size],
+                        options['repeat'])
+                    self.stderr.write(
+                        f'{name} x{size}: '
+                        f'{report[f"{name}:{size}"]["speedup"]}x')
+            transaction.set_rollback(True)
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def fill(self, size):
+        author, _ = User.objects.get_or_create(username='bench_serializers')
+        missing = size - Post.objects.count()
+        if missing > 0:
+            Post.objects.bulk_create(
+                (Post(author=author, text='Пост для замера')
+                 for _ in range(missing)),
+                batch_size=bulk_batch_size(Post, missing))
+        post = Post.objects.order_by('-pub_date', '-id').first()
+        missing = size - post.comments.count()
+        if missing > 0:
+            Comment.objects.bulk_create(
+                (Comment(post=post, author=author, text='Комментарий')
+                 for _ in range(missing)),
+                batch_size=bulk_batch_size(Comment, missing))
+        return post
+
+    @staticmethod
+    def timed(function, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, statistics.median(timings)
+
+    def measure(self, serializer, fast, queryset, repeat):
+        slow_data, slow_ms = self.timed(
+            lambda: serializer(queryset.all(), many=True).data, repeat)
+        fast_data, fast_ms = self.timed(
+            lambda: fast.serialize(fast.values(queryset.all())), repeat)
+        return {
+            'rows': len(fast_data),
+            'serializer_ms': round(slow_ms, 3),
+            'fast_ms': round(fast_ms, 3),
+            'speedup': round(slow_ms / fast_ms, 1) if fast_ms else None,
+            'same_output': json.dumps(slow_data) == json.dumps(fast_data),
+        }
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from api.export import export_posts
+from api.filters import filter_posts
+from api.settings import API_EXPORT_CHUNK_SIZE
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты в NDJSON: один JSON-объект на строку.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Дата в ISO 8601.')
+        parser.add_argument('--group', help='id группы.')
+        parser.add_argument('--author', help='username автора.')
+        parser.add_argument('--comments', action='store_true',
+                            help='Добавить к постам комментарии.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=API_EXPORT_CHUNK_SIZE)
+        parser.add_argument('--output', help='Файл, по умолчанию stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            posts = filter_posts(Post.objects.all(), options)
+        except ValidationError as error:
+            raise CommandError(error.detail)
+        lines = export_posts(posts, options['comments'],
+                             chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
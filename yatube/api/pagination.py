@@ -0,0 +1,86 @@
+from collections import OrderedDict
+
+from rest_framework import pagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from posts.pagination import get_keyset_page, keyset_filter
+
+from .settings import API_MAX_PAGE_SIZE, API_PAGE_SIZE
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class BoundedLimitOffsetPagination(pagination.LimitOffsetPagination):
+    """limit/offset, где ?limit= не больше max_limit.
+
+    Без ?limit= список, как и раньше, отдаётся обычным массивом.
+    """
+    default_limit = None
+    max_limit = API_MAX_PAGE_SIZE
+
+
+class KeysetPagination(BoundedLimitOffsetPagination):
+    """limit/offset по умолчанию, курсор по (date_field, id) по запросу.
+
+    Клиент включает курсорный режим параметром ?cursor= (пустым для первой
+    страницы) и дальше ходит по ссылкам next/previous. В этом режиме нет
+    ни COUNT(*), ни OFFSET, а limit ограничен max_limit.
+    """
+    date_field = 'pub_date'
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page = None
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        limit = self.get_limit(request) or API_PAGE_SIZE
+        token = request.query_params[self.cursor_query_param]
+        params = {}
+        if token[:1] == NEXT:
+            params['before'] = token[1:]
+        elif token[:1] == PREVIOUS:
+            params['after'] = token[1:]
+
+        def fetch(position, reverse, limit):
+            return list(keyset_filter(
+                queryset, position, reverse, date_field=self.date_field
+            )[:limit])
+
+        self.page = get_keyset_page(
+            params, fetch, per_page=limit, position_of=self.position_of)
+        return list(self.page)
+
+    def position_of(self, obj):
+        # Строки из values() приходят словарями.
+        if isinstance(obj, dict):
+            return obj[self.date_field], obj['id']
+        return getattr(obj, self.date_field), obj.pk
+
+    def get_cursor_link(self, prefix, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.offset_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, prefix + cursor)
+
+    def get_paginated_response(self, data):
+        if self.page is None:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_cursor_link(NEXT, self.page.next_cursor)),
+            ('previous', self.get_cursor_link(
+                PREVIOUS, self.page.previous_cursor)),
+            ('results', data),
+        ]))
+
+
+class PostPagination(KeysetPagination):
+    date_field = 'pub_date'
+
+
+class CommentPagination(KeysetPagination):
+    date_field = 'created'
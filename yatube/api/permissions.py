@@ -5,4 +5,5 @@ class NotAuthorReadrOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        return obj.author == request.user
+        # Сравнение по id не загружает автора из БД.
+        return obj.author_id == request.user.id
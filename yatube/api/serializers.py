@@ -1,12 +1,31 @@
+import copy
+from functools import partial
+
 from rest_framework import serializers
 from rest_framework.relations import SlugRelatedField
-from django.db import models
-from rest_framework.generics import get_object_or_404
 
+from posts.images import ingest
 from posts.models import Comment, Post, Group, Follow, User
 
 
-class PostSerializer(serializers.ModelSerializer):
+def source_column(field):
+    """Колонка для values() и only(), из которой читается поле."""
+    if isinstance(field, serializers.SlugRelatedField):
+        return f'{field.source}__{field.slug_field}'
+    return field.source
+
+
+class SparseFieldsSerializer(serializers.ModelSerializer):
+    """Отдаёт только поля из fields=, если они переданы."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class PostSerializer(SparseFieldsSerializer):
     author = SlugRelatedField(slug_field='username', read_only=True)
 
     class Meta:
@@ -14,15 +33,18 @@ class PostSerializer(serializers.ModelSerializer):
         model = Post
         read_only_fields = ('id', 'author', 'pub_date')
 
+    def validate_image(self, image):
+        return ingest(image) if image else image
 
-class GroupSerializer(serializers.ModelSerializer):
+
+class GroupSerializer(SparseFieldsSerializer):
     class Meta:
         model = Group
         fields = ('id', 'title', 'slug', 'description')
         read_only_fields = ('id', )
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsSerializer):
     author = serializers.SlugRelatedField(
         read_only=True, slug_field='username'
     )
@@ -36,35 +58,92 @@ class CommentSerializer(serializers.ModelSerializer):
 class FollowSerializer(serializers.ModelSerializer):
     user = serializers.SlugRelatedField(
         slug_field='username',
-        queryset=User.objects.all(),
+        read_only=True,
         default=serializers.CurrentUserDefault())
     following = serializers.SlugRelatedField(
         slug_field='username',
+        source='author',
         queryset=User.objects.all())
 
     def validate(self, data):
-        user = get_object_or_404(User, username=data['following'].username)
-        follow = Follow.objects.filter(
-            user=self.context['request'].user, following=user).exists()
-        if user == self.context['request'].user:
+        user = self.context['request'].user
+        if data['author'] == user:
             raise serializers.ValidationError(
                 'Вы не можете подписаться сам на себя')
-        if follow is True:
+        if Follow.objects.filter(user=user, author=data['author']).exists():
             raise serializers.ValidationError(
                 'Вы уже подписаны на пользователя')
         return data
 
     class Meta:
         model = Follow
-        fields = '__all__'
+        fields = ('id', 'user', 'following')
+
+
+class FastReadSerializer:
+    """Быстрая сериализация списков без создания моделей.
+
+    Поля ModelSerializer разбираются один раз: для каждого запоминается
+    колонка для values() и функция форматирования. Строки приходят
+    словарями из values(), автор - через join по author__username, а
+    JSON получается тем же, что у исходного сериализатора.
+    """
 
-        constraints = [
-            models.UniqueConstraint(
-                fields=['following', 'user'],
-                name='unique_following'
-            ),
-            models.CheckConstraint(
-                check=~models.Q(user=models.F('following')),
-                name='prevent_self_follow',
-            )
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        self.accessors = [
+            self.compile(name, field)
+            for name, field in serializer_class().fields.items()
         ]
+        self.columns = [column for _, column, _ in self.accessors]
+
+    def compile(self, name, field):
+        column = source_column(field)
+        if isinstance(field, serializers.FileField):
+            return name, column, self.file_url(field)
+        if isinstance(field, (serializers.RelatedField,
+                              serializers.IntegerField,
+                              serializers.CharField,
+                              serializers.BooleanField)):
+            return name, column, None
+        return name, column, field.to_representation
+
+    def file_url(self, field):
+        storage = self.model._meta.get_field(field.source).storage
+
+        def to_representation(value, request=None):
+            if not value:
+                return None
+            url = storage.url(value)
+            return request.build_absolute_uri(url) if request else url
+        to_representation.needs_request = True
+        return to_representation
+
+    def restrict(self, fields):
+        """Копия, которая читает и отдаёт только поля fields."""
+        fast = copy.copy(self)
+        fast.accessors = [
+            accessor for accessor in self.accessors if accessor[0] in fields]
+        fast.columns = [column for _, column, _ in fast.accessors]
+        return fast
+
+    def values(self, queryset, *extra):
+        return queryset.values(*dict.fromkeys((*self.columns, *extra)))
+
+    def serialize(self, rows, request=None):
+        accessors = [
+            (name, column,
+             partial(convert, request=request)
+             if getattr(convert, 'needs_request', False) else convert)
+            for name, column, convert in self.accessors
+        ]
+        return [
+            {name: row[column] if convert is None else convert(row[column])
+             for name, column, convert in accessors}
+            for row in rows
+        ]
+
+
+FastPostSerializer = FastReadSerializer(PostSerializer)
+FastCommentSerializer = FastReadSerializer(CommentSerializer)
@@ -0,0 +1,12 @@
+API_PAGE_SIZE = 10
+API_MAX_PAGE_SIZE = 100
+# Списки постов и комментариев собираются из values() без моделей.
+API_FAST_LIST = True
+# Ограничение на число объектов в одном запросе к .../bulk/
+API_BULK_MAX_ITEMS = 100
+# Сколько постов выгрузка читает из БД за раз.
+API_EXPORT_CHUNK_SIZE = 500
+# Сколько имён можно проверить одним запросом к follow/check/
+API_FOLLOW_CHECK_MAX = 100
+# Сколько секунд пользователь JWT-запроса живёт в кэше.
+API_AUTH_CACHE_TIMEOUT = 60
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from posts.models import User
+
+from .authentication import forget_user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Смена пароля или блокировка должна сразу дойти до API.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    forget_user(instance.pk)
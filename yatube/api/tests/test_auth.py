@@ -0,0 +1,84 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.authentication import USER_CACHE_KEY
+from posts.models import Post, User
+
+POSTS = '/api/v1/posts/'
+FOLLOW = '/api/v1/follow/'
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', password='secret-password')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get_token(self, password='secret-password'):
+        return self.client.post('/api/v1/jwt/create/', {
+            'username': 'reader', 'password': password}).json()['access']
+
+    def get(self, url, token):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_user_is_cached(self):
+        token = self.get_token()
+        # Пользователь и подписки, затем только подписки.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get(FOLLOW, token).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(FOLLOW, token).status_code, 200)
+
+    def test_password_change_revokes_tokens(self):
+        token = self.get_token()
+        self.get(FOLLOW, token)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password')
+        user.save()
+        self.assertEqual(self.get(FOLLOW, token).status_code, 401)
+        token = self.get_token('new-password')
+        self.assertEqual(self.get(FOLLOW, token).status_code, 200)
+
+    def test_deactivation_revokes_tokens(self):
+        token = self.get_token()
+        self.get(FOLLOW, token)
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.get(FOLLOW, token).status_code, 401)
+
+    def test_stateless_reads(self):
+        token = self.get_token()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(POSTS, token).status_code, 200)
+        response = self.client.post(
+            POSTS, {'text': 'Новый'}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['author'], 'reader')
+
+    def test_cache_keeps_no_password_hash(self):
+        self.get(FOLLOW, self.get_token())
+        cached = cache.get(USER_CACHE_KEY.format(self.user.pk))
+        self.assertEqual(set(cached), {'username', 'is_active', 'version'})
+
+    def test_export_checks_token_version(self):
+        token = self.get_token()
+        self.assertEqual(self.get(f'{POSTS}export/', token).status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password')
+        user.save()
+        self.assertEqual(self.get(f'{POSTS}export/', token).status_code, 401)
+        self.assertEqual(self.get(POSTS, token).status_code, 200)
+
+    def test_tokens_without_version(self):
+        token = AccessToken.for_user(self.user)
+        for _ in range(2):
+            with self.assertNumQueries(2):
+                self.assertEqual(self.get(FOLLOW, token).status_code, 200)
@@ -0,0 +1,85 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from posts.models import Comment, Group, Post, User
+
+EXPORT = '/api/v1/posts/export/'
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.old = Post.objects.create(author=cls.author, text='Старый')
+        Post.objects.filter(pk=cls.old.pk).update(
+            pub_date=timezone.now() - timedelta(days=10))
+        cls.posts = [
+            Post.objects.create(author=author, text='Пост', group=group)
+            for author, group in [(cls.author, cls.group),
+                                  (cls.other, cls.group),
+                                  (cls.author, None)]
+        ]
+        Comment.objects.create(
+            author=cls.other, post=cls.posts[0], text='Коммент')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def export(self, query=''):
+        response = self.client.get(EXPORT + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(
+            response.streaming_content).decode().splitlines()]
+
+    def test_export_filters(self):
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        cases = [
+            ['', [self.old] + self.posts],
+            [f'?since={since}', self.posts],
+            [f'?group={self.group.pk}', self.posts[:2]],
+            ['?author=author', [self.old, self.posts[0], self.posts[2]]],
+            [f'?author=author&group={self.group.pk}', self.posts[:1]],
+        ]
+        for query, posts in cases:
+            with self.subTest(query=query):
+                self.assertEqual([item['id'] for item in self.export(query)],
+                                 [post.pk for post in posts])
+
+    def test_export_comments_in_batches(self):
+        # Посты и одна пачка комментариев.
+        with self.assertNumQueries(2):
+            items = self.export('?comments=1')
+        self.assertEqual(len(items[1]['comments']), 1)
+        self.assertEqual(items[1]['comments'][0]['author'], 'other')
+        self.assertEqual(items[0]['comments'], [])
+        for query in ('?comments=0', '?comments=false'):
+            with self.subTest(query=query):
+                self.assertNotIn('comments', self.export(query)[1])
+
+    def test_export_errors(self):
+        self.assertEqual(
+            self.client.get(f'{EXPORT}?since=вчера').status_code, 400)
+        self.assertEqual(
+            self.client.get(f'{EXPORT}?comments=да').status_code, 400)
+        self.assertEqual(APIClient().get(EXPORT).status_code, 401)
+
+    def test_export_command(self):
+        output = StringIO()
+        call_command('export_posts', author='author', comments=True,
+                     chunk_size=2, stdout=output)
+        items = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(
+            [item['id'] for item in items],
+            [self.old.pk, self.posts[0].pk, self.posts[2].pk])
+        self.assertEqual(items, self.export('?author=author&comments=1'))
@@ -0,0 +1,442 @@
+from unittest.mock import patch
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.filters import prefix_range
+from api.pagination import BoundedLimitOffsetPagination
+from api.settings import API_PAGE_SIZE
+from core.testing import assert_indexed, query_plan
+
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry,
+                          User)
+
+POSTS = '/api/v1/posts/'
+FOLLOW = '/api/v1/follow/'
+
+
+class ApiQueryCountTests(TestCase):
+    """Число запросов к БД не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(5)
+        ]
+        cls.post = Post.objects.create(
+            author=cls.authors[0], text='Пост', group=cls.group)
+        cls.COMMENTS = f'{POSTS}{cls.post.pk}/comments/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_rows(self):
+        for author in self.authors:
+            Post.objects.create(author=author, text='Пост', group=self.group)
+            Comment.objects.create(
+                author=author, post=self.post, text='Коммент')
+            Follow.objects.create(user=self.user, author=author)
+
+    def test_list_queries_do_not_grow(self):
+        urls = [
+            [POSTS, 1],
+            [f'{POSTS}?limit=10', 2],
+            [self.COMMENTS, 2],
+            [FOLLOW, 1],
+            [f'{FOLLOW}?search=author', 1],
+            [f'{FOLLOW}check/?username=author0,author1,reader', 1],
+        ]
+        for url, queries in urls:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.client.get(url)
+        self.add_rows()
+        for url, queries in urls:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.client.get(url)
+
+    def test_detail_queries(self):
+        with self.assertNumQueries(1):
+            self.client.get(f'{POSTS}{self.post.pk}/')
+
+    def test_permission_does_not_load_author(self):
+        self.client.force_authenticate(self.authors[0])
+        # Пост с автором и группой, старая группа поста, UPDATE.
+        with self.assertNumQueries(3):
+            response = self.client.patch(
+                f'{POSTS}{self.post.pk}/', {'text': 'Правка'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_lists_use_indexes(self):
+        self.add_rows()
+        for url in [POSTS, f'{POSTS}?limit=5&offset=2', self.COMMENTS,
+                    f'{POSTS}{self.post.pk}/', f'{POSTS}?cursor=',
+                    f'{self.COMMENTS}?cursor=', FOLLOW,
+                    f'{FOLLOW}?search=author', f'{FOLLOW}check/?username=a,b']:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                assert_indexed(queries.captured_queries)
+
+
+class ApiFollowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        for name in ['anna', 'andrew', 'boris', 'Anton']:
+            Follow.objects.create(
+                user=cls.user,
+                author=User.objects.create_user(username=name))
+        cls.free = User.objects.create_user(username='annette')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_follow_create(self):
+        response = self.client.post(FOLLOW, {'following': 'annette'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.json(),
+            {'id': response.json()['id'], 'user': 'reader',
+             'following': 'annette'})
+        self.assertTrue(Follow.objects.filter(
+            user=self.user, author=self.free).exists())
+        for username in ['annette', 'reader', 'nobody']:
+            with self.subTest(username=username):
+                self.assertEqual(self.client.post(
+                    FOLLOW, {'following': username}).status_code, 400)
+
+    def test_prefix_search(self):
+        for prefix, names in [['an', ['andrew', 'anna']], ['ann', ['anna']],
+                              ['An', ['Anton']], ['z', []]]:
+            with self.subTest(prefix=prefix):
+                data = self.client.get(FOLLOW, {'search': prefix}).json()
+                self.assertEqual(
+                    sorted(item['following'] for item in data), names)
+        self.assertEqual(prefix_range('name', 'an', 'postgresql'),
+                         {'name__startswith': 'an'})
+
+    def test_check(self):
+        response = self.client.get(
+            f'{FOLLOW}check/', {'username': 'anna,annette,boris,nobody'})
+        self.assertEqual(response.json(), {
+            'anna': True, 'annette': False, 'boris': True, 'nobody': False})
+        with patch('api.views.API_FOLLOW_CHECK_MAX', 2):
+            self.assertEqual(self.client.get(
+                f'{FOLLOW}check/', {'username': 'a,b,c'}).status_code, 400)
+        self.assertEqual(
+            APIClient().get(f'{FOLLOW}check/').status_code, 401)
+
+
+class ApiPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Пост {i}') for i in range(25))
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(author=cls.author, post=cls.post, text='Коммент')
+            for i in range(15))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(url).json()
+            self.assertFalse(any(
+                'COUNT(' in query['sql']
+                for query in queries.captured_queries))
+            self.assertNotIn('count', page)
+            pages.append(page)
+            ids += [item['id'] for item in page['results']]
+            url = page['next']
+        return ids, pages
+
+    def test_cursor_walks_every_post_once(self):
+        ids, pages = self.walk(f'{POSTS}?cursor=&limit=10')
+        self.assertEqual(len(pages), 3)
+        expected = list(Post.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        previous = self.client.get(pages[2]['previous']).json()
+        self.assertEqual(previous['results'], pages[1]['results'])
+
+    def test_comment_cursor(self):
+        ids, pages = self.walk(f'{POSTS}{self.post.pk}/comments/?cursor=')
+        self.assertEqual(len(ids), 15)
+        self.assertEqual(len(set(ids)), 15)
+        self.assertEqual(len(pages[0]['results']), API_PAGE_SIZE)
+
+    def test_limit_is_bounded(self):
+        for url in [f'{POSTS}?limit=1000', f'{POSTS}?cursor=&limit=1000']:
+            with self.subTest(url=url):
+                with patch.object(BoundedLimitOffsetPagination,
+                                  'max_limit', 5):
+                    page = self.client.get(url).json()
+                self.assertEqual(len(page['results']), 5)
+
+    def test_limit_offset_still_works(self):
+        page = self.client.get(f'{POSTS}?limit=5&offset=20').json()
+        self.assertEqual(page['count'], 25)
+        self.assertEqual(len(page['results']), 5)
+
+
+class ApiConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.COMMENTS = f'{POSTS}{cls.post.pk}/comments/'
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_not_modified_until_data_changes(self):
+        urls = [POSTS, f'{POSTS}{self.post.pk}/', self.COMMENTS,
+                '/api/v1/groups/']
+        etags = {}
+        for url in urls:
+            with self.subTest(url=url):
+                etags[url] = self.client.get(url)['ETag']
+                # Для комментариев - проверка, что пост существует.
+                with self.assertNumQueries(int(url == self.COMMENTS)):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 304)
+        Comment.objects.create(author=self.author, post=self.post, text='Ок')
+        for url in urls[:3]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 200)
+        self.assertEqual(self.client.get(
+            urls[3], HTTP_IF_NONE_MATCH=etags[urls[3]]).status_code, 304)
+
+    def test_missing_parent_is_not_found(self):
+        etag = self.client.get(self.COMMENTS)['ETag']
+        # Поколения не сброшены, например запись вытеснена из кэша.
+        with patch('posts.signals.cache'):
+            Post.objects.get(pk=self.post.pk).delete()
+        self.assertEqual(self.client.get(
+            self.COMMENTS, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+
+class FastListTests(TestCase):
+    """Быстрая сериализация списков отдаёт тот же JSON."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, text='С картинкой', group=group,
+            image='posts/picture.jpg')
+        Post.objects.create(author=cls.author, text='Без группы')
+        Comment.objects.create(author=cls.author, post=cls.post, text='Ок')
+
+    def test_same_output_as_model_serializer(self):
+        client = APIClient()
+        for url in [POSTS, f'{POSTS}?limit=1', f'{POSTS}?cursor=&limit=1',
+                    f'{POSTS}{self.post.pk}/comments/']:
+            with self.subTest(url=url):
+                fast = client.get(url).json()
+                with patch('api.views.API_FAST_LIST', False):
+                    slow = client.get(url).json()
+                self.assertEqual(fast, slow)
+
+
+class ApiBulkCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.COMMENTS = f'{POSTS}{cls.post.pk}/comments/bulk/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_posts_bulk(self):
+        payload = [{'text': f'Пост {i}', 'group': self.group.pk}
+                   for i in range(5)]
+        payload.insert(2, {'group': self.group.pk})
+        with patch('posts.cache.posts_changed') as posts_changed:
+            response = self.client.post(
+                f'{POSTS}bulk/', payload, format='json')
+        # Поколения сбрасываются только после фиксации транзакции.
+        posts_changed.assert_not_called()
+        self.assertEqual(response.status_code, 207)
+        results = response.json()
+        self.assertEqual([item['status'] for item in results],
+                         [201, 201, 400, 201, 201, 201])
+        self.assertIn('text', results[2]['errors'])
+        created = [item['data'] for item in results if item['status'] == 201]
+        self.assertEqual(
+            [post['text'] for post in created],
+            list(Post.objects.filter(
+                pk__in=[post['id'] for post in created]
+            ).order_by('id').values_list('text', flat=True)))
+        self.assertEqual(created[0]['author'], 'author')
+        # То же, что делают сигналы при одиночном создании.
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).stats.posts_count, 6)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 6)
+
+    def test_comments_bulk(self):
+        payload = [{'text': 'Раз'}, {'text': ''}, {'text': 'Два'}]
+        response = self.client.post(self.COMMENTS, payload, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).stats.comments_count, 2)
+        response = self.client.post(
+            f'{POSTS}0/comments/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_limit(self):
+        with patch('api.views.API_BULK_MAX_ITEMS', 2):
+            response = self.client.post(
+                f'{POSTS}bulk/', [{'text': 'Пост'}] * 3, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            f'{POSTS}bulk/', {'text': 'Пост'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_guest_cannot_bulk(self):
+        response = APIClient().post(
+            f'{POSTS}bulk/', [{'text': 'Пост'}], format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class ApiSparseFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+        Comment.objects.create(author=cls.author, post=cls.post, text='Ок')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, ' '.join(
+            query['sql'] for query in queries.captured_queries)
+
+    def test_fields_trim_output_and_columns(self):
+        urls = [
+            [f'{POSTS}?fields=id,author,pub_date', 'text'],
+            [f'{POSTS}?fields=id,author,pub_date&limit=1', 'text'],
+            [f'{POSTS}?fields=id,author,pub_date&cursor=', 'text'],
+            [f'{POSTS}{self.post.pk}/?fields=id,author,pub_date', 'text'],
+            [f'{POSTS}{self.post.pk}/comments/?fields=id,created', 'text'],
+            ['/api/v1/groups/?fields=id,slug', 'description'],
+            [f'/api/v1/groups/{self.group.pk}/?fields=id,slug',
+             'description'],
+        ]
+        for url, column in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                response, sql = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                if isinstance(data, dict):
+                    data = data.get('results', [data])
+                expected = url.split('fields=')[1].split('&')[0].split(',')
+                self.assertEqual(list(data[0]), expected)
+                self.assertNotIn(f'."{column}"', sql)
+
+    def test_unrequested_relations_are_not_joined(self):
+        for url in [f'{POSTS}?fields=id,text',
+                    f'{POSTS}{self.post.pk}/?fields=id,group']:
+            with self.subTest(url=url):
+                response, sql = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('JOIN', sql)
+
+    def test_unknown_field(self):
+        response = self.client.get(f'{POSTS}?fields=id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json())
+
+
+class ApiFilterTests(TestCase):
+    """Фильтры PostViewSet читают свои индексы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(author=author, text='Пост', group=group,
+                                image=image)
+            for author, group, image in [
+                (cls.author, cls.group, 'posts/a.jpg'),
+                (cls.other, cls.group, ''),
+                (cls.author, None, ''),
+                (cls.other, None, 'posts/b.jpg'),
+            ]
+        ]
+        cls.middle = quote(cls.posts[2].pub_date.isoformat())
+
+    def test_filters(self):
+        first, second, third, fourth = self.posts
+        cases = [
+            [f'group={self.group.pk}', [second, first],
+             'post_group_pub_date_idx'],
+            ['author=author', [third, first], 'post_author_pub_date_idx'],
+            ['has_image=true', [fourth, first], 'post_image_pub_date_idx'],
+            ['has_image=false', [third, second], 'post_no_image_pub_date_idx'],
+            [f'since={self.middle}', [fourth, third], 'post_pub_date_idx'],
+            [f'until={self.middle}', [second, first], 'post_pub_date_idx'],
+            [f'author=other&group={self.group.pk}', [second], '_idx'],
+            [f'group={self.group.pk}&since={self.middle}', [],
+             'post_group_pub_date_idx'],
+        ]
+        client = APIClient()
+        for query, posts, index in cases:
+            for url in [f'{POSTS}?{query}', f'{POSTS}?{query}&limit=10',
+                        f'{POSTS}?{query}&cursor=']:
+                with self.subTest(url=url):
+                    with CaptureQueriesContext(connection) as queries:
+                        data = client.get(url).json()
+                    if isinstance(data, dict):
+                        data = data['results']
+                    self.assertEqual([item['id'] for item in data],
+                                     [post.pk for post in posts])
+                    assert_indexed(queries.captured_queries)
+                    self.assertIn(index, ' '.join(
+                        query_plan(queries.captured_queries[-1]['sql'])))
+
+    def test_invalid_values(self):
+        for query in ['group=group', 'since=вчера', 'has_image=maybe']:
+            with self.subTest(query=query):
+                self.assertEqual(
+                    APIClient().get(f'{POSTS}?{query}').status_code, 400)
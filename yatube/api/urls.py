@@ -3,6 +3,7 @@ from rest_framework_simplejwt.views import (TokenObtainPairView,
                                             TokenRefreshView, TokenVerifyView)
 from rest_framework.routers import SimpleRouter
 
+from api.authentication import VersionedTokenObtainPairSerializer
 from api.views import PostViewSet, GroupViewSet, CommentViewSet, FollowViewSet
 
 router = SimpleRouter()
@@ -17,7 +18,8 @@ app_name = 'api'
 
 urlpatterns = [
     path('v1/', include((router.urls, 'api'))),
-    path('v1/jwt/create/', TokenObtainPairView.as_view()),
+    path('v1/jwt/create/', TokenObtainPairView.as_view(
+        serializer_class=VersionedTokenObtainPairSerializer)),
     path('v1/jwt/refresh/', TokenRefreshView.as_view()),
     path('v1/jwt/verify/', TokenVerifyView.as_view())
 
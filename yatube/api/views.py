@@ -1,57 +1,298 @@
-from rest_framework import filters, mixins, viewsets, pagination
+from django.db import transaction
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.response import Response
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
 
-from posts.models import Post, Group
+from core.cache import conditional_response, get_validators
+from posts import bulk, cache
+from posts.models import Comment, Post, Group
 from api.serializers import (PostSerializer, GroupSerializer,
-                             CommentSerializer, FollowSerializer)
+                             CommentSerializer, FollowSerializer,
+                             FastCommentSerializer, FastPostSerializer,
+                             source_column)
+from api.export import export_posts
+from api.filters import (PostFilterBackend, PrefixSearchFilter,
+                         filter_posts, parse_flag)
+from api.pagination import (BoundedLimitOffsetPagination, CommentPagination,
+                            PostPagination)
 from api.permissions import NotAuthorReadrOnly
+from api.settings import (API_BULK_MAX_ITEMS, API_FAST_LIST,
+                          API_FOLLOW_CHECK_MAX)
 
 
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all()
+class FastListMixin:
+    """list() через FastReadSerializer: values() вместо моделей."""
+    fast_serializer = None
+
+    def get_fast_serializer(self):
+        return self.fast_serializer
+
+    def list(self, request, *args, **kwargs):
+        fast = self.get_fast_serializer()
+        if not API_FAST_LIST or fast is None:
+            return super().list(request, *args, **kwargs)
+        # Колонки, по которым курсорная пагинация строит позицию.
+        date_field = getattr(self.paginator, 'date_field', None)
+        queryset = fast.values(
+            self.filter_queryset(self.get_queryset()),
+            *(('id', date_field) if date_field else ()))
+        page = self.paginate_queryset(queryset)
+        data = fast.serialize(queryset if page is None else page, request)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+
+class SparseFieldsMixin:
+    """?fields=id,author: урезает и ответ, и список колонок в SELECT."""
+    fields_query_param = 'fields'
+
+    @cached_property
+    def requested_fields(self):
+        if self.action not in ('list', 'retrieve'):
+            return None
+        raw = self.request.query_params.get(self.fields_query_param)
+        if not raw:
+            return None
+        fields = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = set(fields) - set(self.get_serializer_class()().fields)
+        if unknown:
+            raise ValidationError({self.fields_query_param: [
+                f'Неизвестные поля: {", ".join(sorted(unknown))}.']})
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.requested_fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_fast_serializer(self):
+        fast = super().get_fast_serializer()
+        fields = self.requested_fields
+        if fast is None or fields is None:
+            return fast
+        return fast.restrict(fields)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.requested_fields
+        if fields is None:
+            return queryset
+        serializer_fields = self.get_serializer_class()().fields
+        columns = {'pk'}
+        date_field = getattr(self.paginator, 'date_field', None)
+        if date_field:
+            columns.add(date_field)
+        columns.update(
+            source_column(serializer_fields[name]) for name in fields)
+        # Связи, которые не нужны, нельзя оставлять в select_related
+        # вместе с only().
+        related = {column.split('__')[0]
+                   for column in columns if '__' in column}
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+
+class ConditionalMixin:
+    """ETag и Last-Modified для list и retrieve из поколений кэша."""
+
+    def get_scopes(self):
+        return (cache.CARDS,)
+
+    def get_parent(self):
+        """Объект, к которому вложен ресурс, или None.
+
+        Вызывается до сверки ETag: иначе для удалённого родителя со
+        старым ETag вернулся бы 304, а не 404.
+        """
+        return None
+
+    def conditional(self, render, request, *args, **kwargs):
+        self.get_parent()
+        generations, changed = get_validators(*self.get_scopes())
+        return conditional_response(
+            request, generations, changed,
+            lambda: render(request, *args, **kwargs),
+            request.accepted_renderer.format)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+class BulkCreateMixin:
+    """POST .../bulk/: список объектов за один запрос и одну транзакцию.
+
+    Каждый элемент проверяется обычным сериализатором. Ответ - список
+    результатов в порядке запроса: созданный объект или ошибки.
+    Наследник задаёт bulk_model и bulk_create - функцию из posts.bulk,
+    которая сохраняет список объектов; поля, которых нет в запросе,
+    возвращает bulk_fields().
+    """
+    bulk_model = None
+    bulk_create = None
+
+    def bulk_fields(self):
+        return {'author': self.request.user}
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError('Ожидается список объектов.')
+        if len(items) > API_BULK_MAX_ITEMS:
+            raise ValidationError(
+                f'Не больше {API_BULK_MAX_ITEMS} объектов за запрос.')
+        results, objects = [], []
+        for item in items:
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                objects.append(self.bulk_model(
+                    **self.bulk_fields(), **serializer.validated_data))
+                results.append(None)
+            else:
+                results.append({'status': status.HTTP_400_BAD_REQUEST,
+                                'errors': serializer.errors})
+        if objects:
+            with transaction.atomic():
+                self.bulk_create(objects)
+        created = iter(objects)
+        results = [
+            result if result is not None else {
+                'status': status.HTTP_201_CREATED,
+                'data': self.get_serializer(next(created)).data,
+            }
+            for result in results
+        ]
+        if len(objects) == len(items):
+            code = status.HTTP_201_CREATED
+        elif objects:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response(results, status=code)
+
+
+class PostViewSet(ConditionalMixin, SparseFieldsMixin, FastListMixin,
+                  BulkCreateMixin, viewsets.ModelViewSet):
+    queryset = Post.objects.select_related('author', 'group')
     serializer_class = PostSerializer
+    fast_serializer = FastPostSerializer
+    bulk_model = Post
+    bulk_create = staticmethod(bulk.create_posts)
     permission_classes = (IsAuthenticatedOrReadOnly, NotAuthorReadrOnly)
-    pagination_class = pagination.LimitOffsetPagination
+    pagination_class = PostPagination
+    filter_backends = (PostFilterBackend,)
+    # Публичное чтение: пользователя хватает из токена, без БД. export
+    # требует входа и идёт через проверку версии токена.
+    stateless_actions = ('list', 'retrieve')
+
+    def get_scopes(self):
+        if self.action == 'retrieve':
+            return cache.CARDS, cache.post_scope(self.kwargs['pk'])
+        return cache.CARDS, cache.INDEX, cache.COMMENTS
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def export(self, request):
+        """NDJSON со всеми постами: ?since=, ?group=, ?author=, ?comments=1"""
+        posts = filter_posts(Post.objects.all(), request.query_params)
+        return StreamingHttpResponse(
+            export_posts(
+                posts, bool(parse_flag(request.query_params, 'comments')),
+                request),
+            content_type='application/x-ndjson')
 
-class GroupViewSet(viewsets.ReadOnlyModelViewSet):
+
+class GroupViewSet(ConditionalMixin, SparseFieldsMixin,
+                   viewsets.ReadOnlyModelViewSet):
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
     permission_classes = (NotAuthorReadrOnly, )
-    pagination_class = pagination.LimitOffsetPagination
+    pagination_class = BoundedLimitOffsetPagination
+    stateless_actions = ('list', 'retrieve')
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ConditionalMixin, SparseFieldsMixin, FastListMixin,
+                     BulkCreateMixin, viewsets.ModelViewSet):
     serializer_class = CommentSerializer
+    fast_serializer = FastCommentSerializer
+    bulk_model = Comment
+    bulk_create = staticmethod(bulk.create_comments)
     permission_classes = (IsAuthenticatedOrReadOnly, NotAuthorReadrOnly)
-    pagination_class = pagination.LimitOffsetPagination
+    pagination_class = CommentPagination
+    stateless_actions = ('list', 'retrieve')
+
+    def get_scopes(self):
+        return cache.CARDS, cache.post_scope(self.kwargs.get('post_id'))
+
+    @cached_property
+    def parent_post(self):
+        return get_object_or_404(
+            Post.objects.only('id'), pk=self.kwargs.get('post_id'))
+
+    def get_parent(self):
+        return self.parent_post
 
     def get_queryset(self):
-        post = get_object_or_404(Post, pk=self.kwargs.get('post_id'))
-        return post.comments.all()
+        return self.parent_post.comments.select_related('author')
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user,
                         post=get_object_or_404(
                             Post, pk=self.kwargs.get('post_id')))
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        self.bulk_post = get_object_or_404(
+            Post, pk=self.kwargs.get('post_id'))
+        return super().bulk(request, *args, **kwargs)
+
+    def bulk_fields(self):
+        return {**super().bulk_fields(), 'post': self.bulk_post}
+
 
 class FollowViewSet(mixins.CreateModelMixin,
                     mixins.ListModelMixin,
                     viewsets.GenericViewSet):
+    """Подписки пользователя.
+
+    ?search=an - авторы, чьё имя начинается с an, с учётом регистра.
+    """
     serializer_class = FollowSerializer
     permission_classes = (IsAuthenticated, )
-    pagination_class = pagination.LimitOffsetPagination
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['following__username', 'user__username']
+    pagination_class = BoundedLimitOffsetPagination
+    filter_backends = (PrefixSearchFilter,)
+    search_field = 'author__username'
 
     def get_queryset(self):
-        return self.request.user.follower.all()
+        return self.request.user.follower.select_related('user', 'author')
+
+    @action(detail=False)
+    def check(self, request):
+        """?username=a,b,c -> {"a": true, "b": false, "c": false}"""
+        names = list(dict.fromkeys(
+            name.strip()
+            for value in request.query_params.getlist('username')
+            for name in value.split(',') if name.strip()))
+        if len(names) > API_FOLLOW_CHECK_MAX:
+            raise ValidationError({'username': [
+                f'Не больше {API_FOLLOW_CHECK_MAX} имён за запрос.']})
+        following = set(request.user.follower.filter(
+            author__username__in=names
+        ).values_list('author__username', flat=True))
+        return Response({name: name in following for name in names})
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
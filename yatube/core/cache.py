@@ -0,0 +1,247 @@
+"""Кэш с инвалидацией через поколения (generation keys).
+
+Каждая область данных (лента, группа, автор...) имеет счётчик поколения.
+Запись в БД увеличивает счётчик, и все ключи, построенные на старом
+значении, просто перестают читаться - удалять их не нужно.
+
+Вместе с поколением хранится время последнего изменения области: из
+них строятся валидаторы ETag и Last-Modified для условных GET-запросов.
+"""
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+GENERATION_KEY = 'generation:{}'
+CHANGED_KEY = 'changed:{}'
+VIEW_CACHE_KEY = 'view:{}:{}'
+LOCK_KEY = '{}:lock'
+# Вместо поколений в ключе последней версии страницы.
+STALE = 'stale'
+# Сколько живёт блокировка пересчёта и сколько без прошлой версии
+# ждать, пока пересчитает другой запрос.
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+LOCK_POLL = 0.05
+EARLY_EXPIRATION_BETA = 1.0
+# Прошлая версия живёт дольше свежей: когда свежая истекает по времени,
+# её ещё есть кому отдать, пока один запрос пересчитывает страницу.
+STALE_TIMEOUT_FACTOR = 2
+
+
+def new_generation():
+    # Начальное значение растёт со временем: если счётчик вытеснили из
+    # кэша, он не вернётся к уже использованному номеру.
+    return time.time_ns() // 1000
+
+
+def get_generations(*scopes):
+    """Текущие поколения областей, одним запросом к кэшу."""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, new_generation(), None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def get_validators(*scopes):
+    """Поколения областей и время самого позднего их изменения."""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    changed_keys = [CHANGED_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys + changed_keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, new_generation(), None)
+            found[key] = cache.get(key)
+    for key in changed_keys:
+        # Если время вытеснено, считаем, что область изменилась сейчас:
+        # так клиент в худшем случае получит страницу заново.
+        if key not in found:
+            cache.add(key, time.time(), None)
+            found[key] = cache.get(key)
+    return (tuple(found[key] for key in keys),
+            max((found[key] for key in changed_keys), default=None))
+
+
+def bump_generation(*scopes):
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_generation(), None)
+    now = time.time()
+    cache.set_many(
+        {CHANGED_KEY.format(scope): now for scope in scopes}, None)
+
+
+def fingerprint(request, generations, *extra):
+    user = request.user.pk if request.user.is_authenticated else ''
+    raw = f'{request.get_full_path()}|{user}|{generations}|{extra}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def get_cache_key(request, name, generations):
+    return VIEW_CACHE_KEY.format(name, fingerprint(request, generations))
+
+
+def conditional_response(request, generations, changed, render, *extra):
+    """Отвечает 304, если у клиента актуальная копия, иначе render().
+
+    ETag строится из поколений областей, Last-Modified - из времени их
+    изменения, поэтому для проверки не нужно ни рендерить страницу, ни
+    ходить в БД.
+    """
+    etag = quote_etag(fingerprint(request, generations, *extra))
+    last_modified = int(changed) if changed is not None else None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render()
+    # У устаревшей копии валидаторы новых поколений ставить нельзя:
+    # иначе клиент закрепит её у себя через 304.
+    if getattr(response, 'served_stale', False):
+        return response
+    if response.status_code in (200, 304):
+        response.setdefault('ETag', etag)
+        if last_modified is not None:
+            response.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+def conditional_view(scopes, forms=False):
+    """Условный GET для view, зависящей от областей scopes().
+
+    forms=True - страница выводит формы с CSRF-токеном: он входит в ETag,
+    иначе после нового входа 304 оставил бы у клиента страницу со старым
+    токеном, и отправка формы упала бы с ошибкой CSRF.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            generations, changed = get_validators(
+                *scopes(request, *args, **kwargs))
+            extra = ()
+            if forms and request.user.is_authenticated:
+                # get_token() солит токен заново при каждом вызове, а
+                # CSRF_COOKIE меняется только вместе с секретом.
+                get_token(request)
+                extra = (request.META['CSRF_COOKIE'],)
+            return conditional_response(
+                request, generations, changed,
+                lambda: view(request, *args, **kwargs), *extra)
+        return wrapper
+    return decorator
+
+
+def refresh_early(delta, expires, beta, now=None):
+    """Вероятностное раннее истечение (XFetch).
+
+    Чем ближе expires и чем дольше страница считалась (delta), тем
+    вероятнее, что очередной запрос пересчитает её заранее, и запись не
+    истекает сразу у всех.
+    """
+    if expires is None or not beta:
+        return False
+    now = time.time() if now is None else now
+    return now - delta * beta * math.log(1 - random.random()) >= expires
+
+
+def cacheable(response):
+    return (response.status_code == 200 and not response.streaming
+            and not response.cookies)
+
+
+def wait_for(key, wait=LOCK_WAIT):
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return None
+
+
+def single_flight(key, stale_key, timeout, beta, compute):
+    """Ответ из кэша, а при промахе - один пересчёт на все процессы.
+
+    Пересчитывает тот, кто взял блокировку. Остальные получают прошлую
+    версию страницы (stale-while-revalidate), а если её нет - ждут
+    свежую не дольше LOCK_WAIT.
+    """
+    lock = LOCK_KEY.format(key)
+    entry = cache.get(key)
+    if entry is not None:
+        response, delta, expires = entry
+        if (not refresh_early(delta, expires, beta)
+                or not cache.add(lock, 1, LOCK_TIMEOUT)):
+            return response
+        locked = True
+    else:
+        locked = cache.add(lock, 1, LOCK_TIMEOUT)
+        if not locked:
+            stale = cache.get(stale_key)
+            if stale is not None:
+                stale.served_stale = True
+                return stale
+            response = wait_for(key)
+            if response is not None:
+                return response
+    try:
+        start = time.perf_counter()
+        response = compute()
+        delta = time.perf_counter() - start
+        if cacheable(response):
+            expires = None if timeout is None else time.time() + timeout
+            cache.set(key, (response, delta, expires), timeout)
+            cache.set(stale_key, response,
+                      None if timeout is None
+                      else timeout * STALE_TIMEOUT_FACTOR)
+    finally:
+        if locked:
+            cache.delete(lock)
+    return response
+
+
+def cache_view(timeout, scopes=None, beta=EARLY_EXPIRATION_BETA):
+    """Кэширует ответ view до изменения данных в её областях.
+
+    scopes(request, *args, **kwargs) возвращает имена областей, от
+    которых зависит страница. В отличие от cache_page ответ отдельный
+    для каждого пользователя и не получает Cache-Control: max-age, чтобы
+    браузеры не держали копию дольше, чем живёт поколение. Вместо этого
+    ответ получает ETag и Last-Modified, и повторный запрос с ними
+    получает 304 без обращения к кэшу страниц.
+
+    После сброса поколения страницу пересчитывает один запрос, а
+    остальные в это время получают прошлую версию (см. single_flight).
+    beta=0 отключает раннее истечение.
+    """
+    def decorator(view):
+        name = f'{view.__module__}.{view.__name__}'
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            names = scopes(request, *args, **kwargs) if scopes else ()
+            generations, changed = get_validators(*names)
+            return conditional_response(
+                request, generations, changed,
+                lambda: single_flight(
+                    get_cache_key(request, name, generations),
+                    get_cache_key(request, name, STALE),
+                    timeout, beta,
+                    lambda: view(request, *args, **kwargs)))
+        return wrapper
+    return decorator
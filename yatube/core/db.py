@@ -0,0 +1,34 @@
+from django.db import router, connections
+from django.db.models import AutoField
+
+
+def bulk_batch_size(model, batch_size):
+    """Размер пачки для bulk_create, который примет бэкенд БД.
+
+    Django 2.2 не ограничивает явно переданный batch_size, а SQLite
+    отказывается выполнять INSERT больше чем на 999 параметров.
+    """
+    connection = connections[router.db_for_write(model)]
+    # Автоинкрементный ключ в INSERT не попадает, а заданный вручную -
+    # попадает.
+    fields = [field for field in model._meta.concrete_fields
+              if not isinstance(field, AutoField)]
+    limit = connection.ops.bulk_batch_size(fields, [None] * batch_size)
+    return max(1, min(batch_size, limit))
+
+
+def bulk_insert(model, objects, batch_size):
+    """bulk_create, после которого у всех объектов проставлен pk.
+
+    Вызывать внутри transaction.atomic. SQLite не возвращает id
+    вставленных строк, но до конца транзакции она держит блокировку
+    записи, поэтому последние len(objects) id принадлежат нашей пачке.
+    """
+    model.objects.bulk_create(
+        objects, batch_size=bulk_batch_size(model, batch_size))
+    if objects and objects[0].pk is None:
+        ids = model.objects.order_by('-pk').values_list(
+            'pk', flat=True)[:len(objects)]
+        for obj, pk in zip(objects, list(ids)[::-1]):
+            obj.pk = pk
+    return objects
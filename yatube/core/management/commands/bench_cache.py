@@ -0,0 +1,113 @@
+import json
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.sqlite_cache import SQLiteCache
+
+VALUE = {'html': 'x' * 2048, 'status': 200}
+
+
+def make_backends(directory):
+    params = {'OPTIONS': {'MAX_ENTRIES': 1000000}}
+    return {
+        'locmem': lambda: LocMemCache('bench', params),
+        'filebased': lambda: FileBasedCache(f'{directory}/files', params),
+        'sqlite': lambda: SQLiteCache(f'{directory}/cache.sqlite3', params),
+    }
+
+
+def timed(operation, number):
+    start = time.perf_counter()
+    for i in range(number):
+        operation(i)
+    elapsed = time.perf_counter() - start
+    return round(number / elapsed) if elapsed else None
+
+
+def single_process(cache, number):
+    cache.clear()
+    cache.set('counter', 0)
+    return {
+        'set_ops': timed(lambda i: cache.set(f'k{i}', VALUE), number),
+        'get_hit_ops': timed(lambda i: cache.get(f'k{i}'), number),
+        'get_miss_ops': timed(lambda i: cache.get(f'miss{i}'), number),
+        'get_many_10_ops': timed(
+            lambda i: cache.get_many([f'k{i - j}' for j in range(10)]),
+            number),
+        'incr_ops': timed(lambda i: cache.incr('counter'), number),
+    }
+
+
+def worker(factory, worker_id, workers, number, barrier, results):
+    # Каждый процесс пишет свои ключи и читает ключи всех процессов, как
+    # воркеры gunicorn, которые делят страницы кэша.
+    cache = factory()
+    for i in range(number):
+        cache.set(f'w{worker_id}:{i}', VALUE)
+    barrier.wait()
+    start = time.perf_counter()
+    hits = 0
+    for i in range(number):
+        hits += cache.get(f'w{i % workers}:{i}') is not None
+    results.put((hits, time.perf_counter() - start))
+
+
+def multi_process(factory, workers, number):
+    factory().clear()
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(
+            factory, worker_id, workers, number, barrier, results))
+        for worker_id in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    hits = sum(hits for hits, _ in measured)
+    slowest = max(elapsed for _, elapsed in measured)
+    return {
+        'workers': workers,
+        'shared_hit_rate': round(hits / (workers * number), 3),
+        'read_ops': round(workers * number / slowest) if slowest else None,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает SQLiteCache с LocMemCache и FileBasedCache: '
+            'операции в секунду в одном процессе и долю попаданий, когда '
+            'несколько процессов делят кэш.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        report = {}
+        try:
+            for name, factory in make_backends(directory).items():
+                report[name] = single_process(
+                    factory(), options['operations'])
+                report[name].update(multi_process(
+                    factory, options['workers'], options['operations']))
+                self.stderr.write(f'{name}: {report[name]}')
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,125 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger('yatube.requests')
+
+_current_stats = ContextVar('request_stats', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """View вышла за бюджет REQUEST_BUDGET."""
+
+
+class RequestStats:
+    """Запросы к БД и время обработки одного HTTP-запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest_sql = ''
+        self.slowest_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.sql_time += duration
+            if duration >= self.slowest_time:
+                self.slowest_time = duration
+                self.slowest_sql = sql
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'slowest_sql_ms': round(self.slowest_time * 1000, 2),
+            'slowest_sql': self.slowest_sql,
+            'template_ms': round(self.template_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.sql_time * 1000:.2f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.2f}',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ))
+
+    def over_budget(self, budget):
+        limits = (
+            ('queries', self.queries, budget.get('QUERIES')),
+            ('sql_ms', self.sql_time * 1000, budget.get('SQL_MS')),
+            ('total_ms', self.total_time * 1000, budget.get('TOTAL_MS')),
+        )
+        return [
+            f'{name}={value:.0f}>{limit}'
+            for name, value, limit in limits
+            if limit is not None and value > limit
+        ]
+
+
+_template_render = Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    stats = _current_stats.get()
+    if stats is None:
+        return _template_render(self, context, request)
+    start = time.perf_counter()
+    try:
+        return _template_render(self, context, request)
+    finally:
+        stats.template_time += time.perf_counter() - start
+
+
+class QueryTimingMiddleware:
+    """Считает запросы к БД, время SQL, шаблонов и всего ответа.
+
+    Итог отдаётся в заголовке Server-Timing и пишется в лог
+    yatube.requests одной JSON-строкой. Если превышен бюджет из
+    settings.REQUEST_BUDGET, пишется предупреждение, а при RAISE=True
+    выбрасывается QueryBudgetExceeded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        Template.render = _timed_render
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        stats.total_time = time.perf_counter() - start
+
+        response['Server-Timing'] = stats.server_timing()
+        record = {'method': request.method, 'path': request.path,
+                  'status': response.status_code, **stats.as_dict()}
+        logger.info(json.dumps(record, ensure_ascii=False))
+
+        budget = getattr(settings, 'REQUEST_BUDGET', {})
+        exceeded = stats.over_budget(budget)
+        if exceeded:
+            message = f'{request.path}: {", ".join(exceeded)}'
+            if budget.get('RAISE'):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
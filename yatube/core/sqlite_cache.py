@@ -0,0 +1,218 @@
+"""Кэш в файле SQLite, общий для всех процессов одного хоста.
+
+LocMemCache у каждого воркера gunicorn свой: попадания делятся на число
+воркеров, а сброс поколения не доходит до соседей. Этот бэкенд хранит
+записи в одном файле в режиме WAL: читатели не блокируют писателя,
+incr и add атомарны за счёт BEGIN IMMEDIATE. Вытеснение - по LRU: время
+последнего чтения обновляется не чаще раза в LRU_RESOLUTION секунд,
+чтобы горячие ключи не превращали каждый get в запись.
+
+    CACHES = {'default': {
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }}
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MAX_PARAMS = 900
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL,'
+    ' expires REAL, accessed REAL NOT NULL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.lru_resolution = float(options.get('LRU_RESOLUTION', 1.0))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 5.0))
+        # Число записей проверяется не на каждом set, а раз в
+        # cull_check_every вставок этого процесса.
+        self.cull_check_every = max(1, self._max_entries // 20)
+        self._sets = 0
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        # После fork соединение родителя использовать нельзя.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None,
+                check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    @contextmanager
+    def write(self):
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def alive(expires, now):
+        return expires is None or expires > now
+
+    def touch_accessed(self, keys, now):
+        if keys:
+            with self.write() as connection:
+                connection.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in keys])
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        if not keys:
+            return {}
+        names = {self.key(key, version): key for key in keys}
+        now = time.time()
+        rows = []
+        batch = list(names)
+        # SQLite старых версий не принимает больше 999 параметров.
+        for start in range(0, len(batch), MAX_PARAMS):
+            part = batch[start:start + MAX_PARAMS]
+            rows += self.connection.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({", ".join("?" * len(part))})',
+                part).fetchall()
+        found, stale = {}, []
+        for name, value, expires, accessed in rows:
+            if not self.alive(expires, now):
+                continue
+            found[names[name]] = pickle.loads(value)
+            if accessed < now - self.lru_resolution:
+                stale.append(name)
+        self.touch_accessed(stale, now)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = [
+            (self.key(key, version),
+             pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires, now)
+            for key, value in data.items()
+        ]
+        with self.write() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)', rows)
+        self.maybe_cull(len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self.key(key, version)
+        now = time.time()
+        with self.write() as connection:
+            row = connection.execute(
+                'SELECT expires FROM cache WHERE key = ?', (name,)).fetchone()
+            if row is not None and self.alive(row[0], now):
+                return False
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                (name, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 self.get_backend_timeout(timeout), now))
+        self.maybe_cull(1)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        name = self.key(key, version)
+        now = time.time()
+        with self.write() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (name,)).fetchone()
+            if row is None or not self.alive(row[1], now):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now, name))
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self.key(key, version)
+        with self.write() as connection:
+            return connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), name, time.time())
+            ).rowcount == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        with self.write() as connection:
+            connection.executemany(
+                'DELETE FROM cache WHERE key = ?',
+                [(self.key(key, version),) for key in keys])
+
+    def has_key(self, key, version=None):
+        row = self.connection.execute(
+            'SELECT expires FROM cache WHERE key = ?',
+            (self.key(key, version),)).fetchone()
+        return row is not None and self.alive(row[0], time.time())
+
+    def clear(self):
+        with self.write() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def maybe_cull(self, inserted):
+        self._sets += inserted
+        if self._sets < self.cull_check_every:
+            return
+        self._sets = 0
+        self.cull()
+
+    def cull(self):
+        """Удаляет просроченные записи, а при переполнении - давно не
+        читанные, 1/CULL_FREQUENCY от всех записей.
+        """
+        with self.write() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),))
+            count = connection.execute(
+                'SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count <= self._max_entries:
+                return
+            number = (count if self._cull_frequency == 0
+                      else max(count - self._max_entries,
+                               count // self._cull_frequency))
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (number,))
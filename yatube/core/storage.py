@@ -0,0 +1,74 @@
+"""Хранилище, которое называет файлы по sha256 содержимого.
+
+Одинаковые загрузки (репосты мемов) ложатся в один файл, и превью для
+него режутся один раз: ключ sorl зависит от имени источника.
+
+    image = models.ImageField(upload_to='posts/',
+                              storage=ContentAddressedStorage())
+
+Файл posts/photo.jpg сохраняется как posts/ab/ab12...ef.jpg. Хэш
+считается по ходу записи во временный файл в том же каталоге, который
+затем атомарно переименовывается в place() - даже если такой файл уже
+есть: байты те же, а файл, который как раз удаляют вместе с последней
+ссылкой, загрузка вернёт на место. Учёт ссылок на файл - забота
+подкласса (posts.storage.PostImageStorage).
+"""
+import hashlib
+import os
+import posixpath
+import secrets
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+
+
+def file_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, digest):
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Настоящее имя станет известно только в _save.
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(posixpath.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        temporary = os.path.join(
+            directory, f'.upload-{secrets.token_hex(8)}')
+        digest = hashlib.sha256()
+        try:
+            # 0o666 с учётом umask, как у FileSystemStorage.
+            fd = os.open(temporary,
+                         os.O_WRONLY | os.O_CREAT | os.O_EXCL
+                         | getattr(os, 'O_BINARY', 0), 0o666)
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    file.write(chunk)
+            name = self.hashed_name(name, digest.hexdigest())
+            self.place(temporary, name)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+    def place(self, temporary, name):
+        """Переносит записанный временный файл на его постоянное имя."""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temporary, path)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
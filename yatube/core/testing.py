@@ -0,0 +1,65 @@
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def query_budget(max_queries, using=connection):
+    """Проверяет, что блок выполнил не больше max_queries запросов к БД.
+
+        with query_budget(5):
+            client.get(url)
+    """
+    with CaptureQueriesContext(using) as context:
+        yield context
+    executed = len(context.captured_queries)
+    if executed > max_queries:
+        queries = '\n'.join(
+            f'{number}. {query["sql"]}'
+            for number, query in enumerate(context.captured_queries, 1))
+        raise AssertionError(
+            f'{executed} queries executed, budget is {max_queries}\n'
+            f'{queries}')
+
+
+class QueryBudgetMixin:
+    """Примесь к TestCase: self.assertMaxQueries(5)."""
+
+    def assertMaxQueries(self, max_queries):
+        return query_budget(max_queries)
+
+
+# Признаки плана, при которых запрос читает таблицу целиком или
+# досортировывает результат вместо чтения индекса по порядку.
+FULL_SCAN_MARKERS = {
+    'sqlite': (re.compile(r'^SCAN (TABLE )?\w+$'),
+               re.compile(r'TEMP B-TREE')),
+    'postgresql': (re.compile(r'Seq Scan'), re.compile(r'^\s*(->\s*)?Sort')),
+}
+
+
+def query_plan(sql, using=connection):
+    explain = ('EXPLAIN QUERY PLAN ' if using.vendor == 'sqlite'
+               else 'EXPLAIN ')
+    with using.cursor() as cursor:
+        cursor.execute(explain + sql)
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def assert_indexed(captured_queries, using=connection):
+    """Каждый SELECT из captured_queries читает данные по индексу."""
+    markers = FULL_SCAN_MARKERS.get(using.vendor)
+    if markers is None:
+        return
+    problems = []
+    for query in captured_queries:
+        if not query['sql'].startswith('SELECT'):
+            continue
+        plan = query_plan(query['sql'], using)
+        if any(marker.search(line) for line in plan for marker in markers):
+            problems.append(f'{query["sql"]}\n    ' + '\n    '.join(plan))
+    if problems:
+        raise AssertionError(
+            'Queries without a usable index:\n' + '\n'.join(problems))
@@ -0,0 +1,87 @@
+import threading
+import time
+from unittest.mock import patch
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from core.cache import bump_generation, cache_view
+
+SCOPE = 'test-stampede'
+
+
+class StampedeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.factory = RequestFactory()
+
+        @cache_view(60, lambda request: (SCOPE,))
+        def view(request):
+            self.calls += 1
+            time.sleep(0.2)
+            return HttpResponse(f'version {self.calls}')
+
+        self.view = view
+
+    def request(self):
+        request = self.factory.get('/stampede/')
+        request.user = AnonymousUser()
+        return self.view(request)
+
+    def concurrent(self, number=8):
+        responses = []
+        threads = [
+            threading.Thread(target=lambda: responses.append(self.request()))
+            for _ in range(number)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_cold_miss_computes_once(self):
+        responses = self.concurrent()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(
+            {response.content for response in responses}, {b'version 1'})
+
+    def test_stale_while_revalidate(self):
+        self.request()
+        bump_generation(SCOPE)
+        responses = self.concurrent()
+        self.assertEqual(self.calls, 2)
+        fresh = [response for response in responses
+                 if response.content == b'version 2']
+        stale = [response for response in responses
+                 if response.content == b'version 1']
+        self.assertEqual(len(fresh), 1)
+        self.assertEqual(len(stale), len(responses) - 1)
+        self.assertIn('ETag', fresh[0])
+        for response in stale:
+            self.assertNotIn('ETag', response)
+        self.assertEqual(self.request().content, b'version 2')
+
+    def test_stale_while_revalidate_after_timeout(self):
+        self.request()
+        # Свежая запись истекла по времени, прошлая версия ещё жива.
+        with patch('time.time', return_value=time.time() + 61):
+            responses = self.concurrent()
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(
+            sorted(response.content for response in responses),
+            [b'version 1'] * (len(responses) - 1) + [b'version 2'])
+
+    def test_early_expiration(self):
+        self.request()
+        with patch('core.cache.random.random', return_value=0.5):
+            self.request()
+        self.assertEqual(self.calls, 1)
+        # За несколько секунд до истечения пересчёт случается заранее.
+        with patch('core.cache.random.random', return_value=0.999999), \
+                patch('time.time', return_value=time.time() + 59):
+            self.assertEqual(self.request().content, b'version 2')
+        self.assertEqual(self.calls, 2)
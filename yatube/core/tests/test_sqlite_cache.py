@@ -0,0 +1,103 @@
+import json
+import multiprocessing
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from core.sqlite_cache import SQLiteCache
+
+
+def increment(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = f'{self.directory}/cache.sqlite3'
+        self.cache = SQLiteCache(self.path, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        cache = self.cache
+        cache.set('a', {'value': 1})
+        self.assertEqual(cache.get('a'), {'value': 1})
+        self.assertIsNone(cache.get('missing'))
+        self.assertFalse(cache.add('a', 2))
+        self.assertTrue(cache.add('b', 2))
+        cache.set_many({'c': 3, 'd': 4})
+        self.assertEqual(cache.get_many(['b', 'c', 'x']), {'b': 2, 'c': 3})
+        self.assertEqual(cache.incr('b', 5), 7)
+        self.assertEqual(cache.decr('b'), 6)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.delete('a')
+        self.assertFalse(cache.has_key('a'))
+        cache.clear()
+        self.assertEqual(cache.get_many(['b', 'c', 'd']), {})
+
+    def test_timeouts(self):
+        cache = self.cache
+        now = time.time()
+        cache.set('short', 1, 10)
+        cache.set('forever', 2, None)
+        cache.set('gone', 3, 0)
+        self.assertIsNone(cache.get('gone'))
+        with patch('core.sqlite_cache.time.time', return_value=now + 11):
+            self.assertIsNone(cache.get('short'))
+            self.assertEqual(cache.get('forever'), 2)
+            self.assertTrue(cache.add('short', 4))
+            with self.assertRaises(ValueError):
+                cache.incr('gone')
+        self.assertTrue(cache.touch('forever', 5))
+        self.assertTrue(cache.has_key('forever'))
+
+    def test_lru_eviction(self):
+        cache = SQLiteCache(self.path, {'OPTIONS': {
+            'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2, 'LRU_RESOLUTION': 0}})
+        now = time.time()
+        for number in range(10):
+            with patch('core.sqlite_cache.time.time',
+                       return_value=now + number):
+                cache.set(number, number)
+        # Старый ключ прочитан последним и переживает вытеснение.
+        with patch('core.sqlite_cache.time.time', return_value=now + 20):
+            cache.get(0)
+        with patch('core.sqlite_cache.time.time', return_value=now + 21):
+            cache.set('new', 1)
+        kept = cache.get_many([*range(10), 'new'])
+        self.assertIn(0, kept)
+        self.assertIn('new', kept)
+        self.assertNotIn(1, kept)
+        self.assertLessEqual(len(kept), 10)
+
+    def test_shared_between_processes(self):
+        self.cache.set('counter', 0, None)
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=increment, args=(self.path, 100))
+                   for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 400)
+
+
+class BenchCacheTests(SimpleTestCase):
+    def test_bench_cache(self):
+        output = StringIO()
+        call_command('bench_cache', operations=20, workers=2,
+                     stdout=output, stderr=StringIO())
+        report = json.loads(output.getvalue())
+        self.assertEqual(set(report), {'locmem', 'filebased', 'sqlite'})
+        self.assertEqual(report['sqlite']['shared_hit_rate'], 1.0)
+        self.assertEqual(report['locmem']['shared_hit_rate'], 0.5)
@@ -0,0 +1,58 @@
+"""Массовое создание постов и комментариев.
+
+bulk_create не отправляет сигналы, поэтому здесь вручную делается то же,
+что в signals.py для одиночной записи: раскладка по лентам, счётчики,
+сброс поколений кэша и превью картинок.
+"""
+from collections import Counter
+
+from django.db import transaction
+
+from core.db import bulk_insert
+
+from . import cache, counters, media, thumbnails, timeline
+from .models import Comment, Post
+
+BATCH_SIZE = 500
+
+
+def create_posts(posts):
+    """Сохраняет посты одной пачкой. Вызывать внутри transaction.atomic."""
+    # Ссылки на загруженные файлы берёт хранилище при вставке.
+    linked = [post for post in posts if post.image and post.image._committed]
+    bulk_insert(Post, posts, BATCH_SIZE)
+    timeline.fan_out(posts)
+    for author_id, number in Counter(
+            post.author_id for post in posts).items():
+        counters.add_to_author(author_id, posts_count=number)
+    authors = {post.author.username for post in posts}
+    group_slugs = {post.group.slug for post in posts if post.group}
+    pks = [post.pk for post in posts]
+    # Сброс до фиксации дал бы соседним запросам снова закэшировать
+    # страницы без новых постов.
+    transaction.on_commit(
+        lambda: cache.posts_changed(authors, group_slugs, posts=pks))
+    media.acquire(*(post.image.name for post in linked))
+    thumbnails.schedule(*{post.image.name for post in posts})
+    return posts
+
+
+def create_comments(comments):
+    """Сохраняет комментарии одной пачкой внутри transaction.atomic."""
+    bulk_insert(Comment, comments, BATCH_SIZE)
+    for author_id, number in Counter(
+            comment.author_id for comment in comments).items():
+        counters.add_to_author(author_id, comments_count=number)
+    post_ids = Counter(comment.post_id for comment in comments)
+    for post_id, number in post_ids.items():
+        counters.add_to_post(post_id, number)
+    authors = {comment.author.username for comment in comments}
+    transaction.on_commit(
+        lambda: comments_committed(post_ids, authors))
+    return comments
+
+
+def comments_committed(post_ids, authors):
+    for post_id in post_ids:
+        cache.comments_changed(post_id)
+    cache.author_changed(*authors)
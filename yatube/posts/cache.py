@@ -0,0 +1,100 @@
+"""Области кэша страниц ленты и их инвалидация."""
+from core.cache import bump_generation, get_generations
+
+from .models import Post
+
+# Общая область для данных, которые выводятся в карточках любой ленты:
+# названия групп и имена авторов.
+CARDS = 'posts:cards'
+INDEX = 'posts:index'
+# Любой комментарий: меняет comments_count в списках постов API.
+COMMENTS = 'posts:comments'
+CARD_POST = 'posts:card:post:{}'
+CARD_AUTHOR = 'posts:card:author:{}'
+CARD_GROUP = 'posts:card:group:{}'
+
+
+def group_scope(slug):
+    return f'posts:group:{slug}'
+
+
+def author_scope(username):
+    return f'posts:author:{username}'
+
+
+def post_scope(pk):
+    return f'posts:post:{pk}'
+
+
+def index_scopes(request):
+    return CARDS, INDEX
+
+
+def group_scopes(request, slug):
+    return CARDS, group_scope(slug)
+
+
+def profile_scopes(request, username):
+    return CARDS, author_scope(username)
+
+
+def post_detail_scopes(request, post_id):
+    # Страница поста выводит и число постов автора.
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True).first()
+    scopes = [CARDS, post_scope(post_id)]
+    if username is not None:
+        scopes.append(author_scope(username))
+    return scopes
+
+
+def posts_changed(authors, group_slugs, posts=()):
+    bump_generation(
+        INDEX,
+        *(post_scope(pk) for pk in posts),
+        *(author_scope(username) for username in authors),
+        *(group_scope(slug) for slug in group_slugs if slug)
+    )
+
+
+def comments_changed(post_id):
+    bump_generation(COMMENTS, post_scope(post_id))
+
+
+def group_changed(*slugs):
+    bump_generation(CARDS, *(group_scope(slug) for slug in slugs))
+
+
+def author_changed(*usernames):
+    bump_generation(*(author_scope(username) for username in usernames))
+
+
+def author_renamed(username):
+    bump_generation(CARDS, author_scope(username))
+
+
+def card_scopes(post):
+    return (
+        CARD_POST.format(post.pk),
+        CARD_AUTHOR.format(post.author_id),
+        CARD_GROUP.format(post.group_id),
+    )
+
+
+def attach_card_versions(posts):
+    """Проставляет постам версию карточки для фрагментного кэша."""
+    posts = list(posts)
+    scopes = [card_scopes(post) for post in posts]
+    generations = iter(get_generations(
+        *(scope for post_scopes in scopes for scope in post_scopes)))
+    for post, post_scopes in zip(posts, scopes):
+        post.card_version = '.'.join(
+            str(next(generations)) for _ in post_scopes)
+
+
+def cards_changed(posts=(), authors=(), groups=()):
+    bump_generation(
+        *(CARD_POST.format(pk) for pk in posts),
+        *(CARD_AUTHOR.format(pk) for pk in authors),
+        *(CARD_GROUP.format(pk) for pk in groups)
+    )
@@ -0,0 +1,81 @@
+"""Денормализованные счётчики постов, комментариев и подписок."""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache import author_changed
+from .models import AuthorStats, Comment, Follow, Post, User
+
+
+def add_to_author(user_id, **deltas):
+    """Атомарно меняет счётчики пользователя: add_to_author(1, posts_count=1).
+
+    Строка счётчиков создаётся только при увеличении: при каскадном
+    удалении пользователя она не должна появиться заново. Уход в минус
+    при рассинхронизации пропускается - его исправит reconcile_counters.
+    """
+    changes = {name: F(name) + delta for name, delta in deltas.items()}
+    floors = {
+        f'{name}__gte': -delta for name, delta in deltas.items() if delta < 0}
+    stats = AuthorStats.objects.filter(user=user_id, **floors)
+    if stats.update(**changes) or floors:
+        return
+    AuthorStats.objects.get_or_create(user_id=user_id)
+    stats.update(**changes)
+
+
+def add_to_post(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def author_counts():
+    """Пользователи с посчитанными заново значениями счётчиков."""
+    return User.objects.annotate(
+        real_posts=_count(Post.objects, 'author'),
+        real_comments=_count(Comment.objects, 'author'),
+        real_followers=_count(Follow.objects, 'author'),
+        real_following=_count(Follow.objects, 'user'),
+    ).values_list(
+        'pk', 'real_posts', 'real_comments', 'real_followers',
+        'real_following')
+
+
+def reconcile():
+    """Исправляет расхождения, возвращает (авторов, постов) исправлено."""
+    existing = AuthorStats.objects.in_bulk()
+    stale_authors = []
+    for user_id, posts, comments, followers, following in (
+            author_counts().iterator()):
+        stats = existing.get(user_id) or AuthorStats(user_id=user_id)
+        real = (posts, comments, followers, following)
+        if stats.pk in existing and real == (
+                stats.posts_count, stats.comments_count,
+                stats.followers_count, stats.following_count):
+            continue
+        (stats.posts_count, stats.comments_count,
+         stats.followers_count, stats.following_count) = real
+        stale_authors.append(stats)
+    for stats in stale_authors:
+        stats.save()
+    author_changed(*User.objects.filter(
+        pk__in=[stats.pk for stats in stale_authors]
+    ).values_list('username', flat=True))
+
+    stale_posts = []
+    for post in Post.objects.annotate(
+            real_comments=_count(Comment.objects, 'post')
+    ).only('pk', 'comments_count').iterator():
+        if post.comments_count != post.real_comments:
+            post.comments_count = post.real_comments
+            stale_posts.append(post)
+    Post.objects.bulk_update(stale_posts, ['comments_count'], batch_size=500)
+    return len(stale_authors), len(stale_posts)
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import ingest
 from .models import Post, Comment
 
 
@@ -8,6 +10,13 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('group', 'text', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # При правке без новой картинки здесь уже сохранённый файл.
+        if isinstance(image, UploadedFile):
+            return ingest(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,113 @@
+"""Приём загруженных картинок.
+
+Без этого шага оригинал хранится как есть: с полным разрешением, EXIF
+(в том числе координатами съёмки) и целиком раскодируется Pillow при
+каждой нарезке превью. ingest проверяет размеры по заголовку до
+раскодирования, отклоняет декомпрессионные бомбы, уменьшает картинку
+до INGEST_MAX_SIZE и перекодирует без метаданных. JPEG раскодируется
+сразу в уменьшенном масштабе (Image.draft), поэтому память на загрузку
+ограничена INGEST_MAX_MEMORY, а не размером оригинала.
+"""
+import io
+import os
+import warnings
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .settings import (INGEST_FORMATS, INGEST_JPEG_QUALITY, INGEST_MAX_BYTES,
+                       INGEST_MAX_MEMORY, INGEST_MAX_PIXELS,
+                       INGEST_MAX_SIZE)
+
+# Pillow хранит пиксель в 4 байтах (кроме режимов 1, L и P), а resize
+# держит сразу исходник, промежуточный проход и результат.
+RESIZE_OVERHEAD = 3
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': INGEST_JPEG_QUALITY, 'optimize': True,
+             'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': INGEST_JPEG_QUALITY},
+}
+
+
+def open_image(upload):
+    """Читает только заголовок: пиксели раскодируются в load()."""
+    if upload.size is not None and upload.size > INGEST_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            params={'limit': INGEST_MAX_BYTES // (1024 * 1024)},
+            code='file_too_large')
+    upload.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            image = Image.open(upload)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise ValidationError('Слишком большое разрешение картинки.',
+                              code='decompression_bomb')
+    except (OSError, SyntaxError):
+        raise ValidationError('Файл не является картинкой.',
+                              code='invalid_image')
+    if image.format not in INGEST_FORMATS:
+        raise ValidationError('Формат %(format)s не поддерживается.',
+                              params={'format': image.format},
+                              code='invalid_format')
+    width, height = image.size
+    if width * height > INGEST_MAX_PIXELS:
+        raise ValidationError('Слишком большое разрешение картинки.',
+                              code='decompression_bomb')
+    return image
+
+
+def peak_memory(image):
+    """Сколько памяти займут раскодирование и уменьшение картинки."""
+    width, height = image.size
+    pixel_bytes = 1 if image.mode in ('1', 'L', 'P') else 4
+    return width * height * pixel_bytes * RESIZE_OVERHEAD
+
+
+def decode(image):
+    """Раскодирует пиксели, не выходя за INGEST_MAX_MEMORY."""
+    image_format = image.format
+    width, height = image.size
+    ratio = INGEST_MAX_SIZE / max(width, height)
+    if ratio < 1:
+        # Для JPEG декодер сразу уменьшает в 2, 4 или 8 раз, но не
+        # меньше итогового размера.
+        image.draft('RGB', (max(1, int(width * ratio)),
+                            max(1, int(height * ratio))))
+    if peak_memory(image) > INGEST_MAX_MEMORY:
+        raise ValidationError('Слишком большое разрешение картинки.',
+                              code='decompression_bomb')
+    try:
+        image.load()
+    except (OSError, SyntaxError):
+        raise ValidationError('Файл картинки повреждён.',
+                              code='invalid_image')
+    return image, image_format
+
+
+def ingest(upload):
+    """Проверенная, уменьшенная и перекодированная копия загрузки.
+
+    Формат и имя файла сохраняются. Анимированные GIF становятся
+    статичными: остаётся первый кадр.
+    """
+    image, image_format = decode(open_image(upload))
+    image.thumbnail((INGEST_MAX_SIZE, INGEST_MAX_SIZE), Image.LANCZOS)
+    # Поворот из EXIF применяется к пикселям уже уменьшенной копии:
+    # сам EXIF не сохраняется.
+    image = ImageOps.exif_transpose(image)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    transparency = image.info.get('transparency')
+    image.info = {}
+    options = dict(SAVE_OPTIONS.get(image_format, {}))
+    if transparency is not None and image_format in ('PNG', 'GIF'):
+        options['transparency'] = transparency
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue(),
+                       name=os.path.basename(upload.name))
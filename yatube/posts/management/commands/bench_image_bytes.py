@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import thumbnails
+from posts.media import source
+from posts.models import Post
+from posts.settings import NUMBER_POSTS, THUMBNAIL_WIDTHS
+
+
+def pick(sizes, needed):
+    """Вариант, который выберет браузер по srcset: самый узкий из тех,
+    что не меньше нужной ширины, иначе самый широкий."""
+    for width in sorted(sizes):
+        if width >= needed:
+            return sizes[width]
+    return sizes[max(sizes)]
+
+
+class Command(BaseCommand):
+    help = ('Считает байты картинок на страницу ленты: один кроп 960px '
+            'против srcset в WebP и формате оригинала для разных экранов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=NUMBER_POSTS)
+        parser.add_argument('--viewport', type=int, action='append',
+                            help='Ширина экрана в CSS-пикселях.')
+        parser.add_argument('--dpr', type=float, default=1.0)
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        names = list(Post.objects.exclude(image='').order_by(
+            '-pub_date', '-id').values_list('image', flat=True)[
+                :options['posts']])
+        if not names:
+            raise CommandError('Нет постов с картинками.')
+        # {формат: {ширина: байты на страницу}}
+        sizes = {}
+        for name in names:
+            for (width, image_format), (geometry, variant_options) in (
+                    thumbnails.VARIANTS.items()):
+                thumbnail = thumbnails.backend.generate(
+                    source(name), geometry, **variant_options)
+                per_width = sizes.setdefault(
+                    (image_format or 'original').lower(), {})
+                per_width[width] = per_width.get(width, 0) + (
+                    thumbnail.storage.size(thumbnail.name))
+
+        legacy = sizes['original'][max(THUMBNAIL_WIDTHS)]
+        report = {'posts': len(names), 'dpr': options['dpr'],
+                  'legacy_bytes': legacy, 'viewports': {}}
+        for viewport in options['viewport'] or (360, 768, 1280):
+            needed = min(viewport, max(THUMBNAIL_WIDTHS)) * options['dpr']
+            served = {image_format: pick(per_width, needed)
+                      for image_format, per_width in sizes.items()}
+            served['saved'] = round(1 - min(served.values()) / legacy, 3)
+            report['viewports'][viewport] = served
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
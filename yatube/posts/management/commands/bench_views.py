@@ -0,0 +1,142 @@
+import json
+import logging
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from sorl.thumbnail import default
+
+from api import urls as api_urls
+from posts import urls as posts_urls
+from posts.thumbnails import LocalKVStore
+from posts.models import Comment, Follow, Post
+
+# Маршруты, которые меняют данные даже на GET
+SKIP_ROUTES = {'profile_follow', 'profile_unfollow', 'add_comment'}
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(share * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все маршруты posts и api через тестовый клиент и '
+            'печатает JSON с задержками, запросами к БД и пропускной '
+            'способностью.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument('--route', action='append', default=[],
+                            help='Гонять только указанные маршруты.')
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        follow = Follow.objects.select_related('user').order_by(
+            '-id').first()
+        post = Post.objects.select_related('author', 'group').filter(
+            group__isnull=False).order_by('-pub_date').first()
+        comment = Comment.objects.order_by('-id').first()
+        if not (follow and post and comment):
+            raise CommandError('Нет данных: сначала выполните seed_load.')
+        reader = follow.user
+        # Редактирование поста доступно только автору.
+        sample = {
+            'slug': post.group.slug,
+            'username': post.author.username,
+            'post_id': post.pk,
+            'post': post.pk,
+            'group': post.group_id,
+            'comment': comment.pk,
+            'comment_post': comment.post_id,
+        }
+        # Построчный лог middleware только мешает замерам.
+        logging.getLogger('yatube.requests').disabled = True
+
+        browser = Client()
+        browser.force_login(post.author)
+        api = APIClient()
+        api.force_authenticate(reader)
+
+        report = {'cold': options['cold'], 'routes': {}}
+        for name, url, client in self.routes(sample, browser, api):
+            if options['route'] and name not in options['route']:
+                continue
+            report['routes'][name] = self.measure(
+                client, url, options['requests'], options['warmup'],
+                options['cold'])
+            self.stderr.write(
+                f'{name}: p50 {report["routes"][name]["p50_ms"]} ms')
+
+        if isinstance(default.kvstore, LocalKVStore):
+            report['thumbnail_kvstore'] = default.kvstore.stats()
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def routes(self, sample, browser, api):
+        for pattern in posts_urls.urlpatterns:
+            if pattern.name in SKIP_ROUTES:
+                continue
+            kwargs = {
+                name: sample[name] for name in pattern.pattern.converters}
+            yield (f'posts:{pattern.name}',
+                   reverse(f'posts:{pattern.name}', kwargs=kwargs), browser)
+        for pattern in api_urls.router.urls:
+            basename, action = pattern.name.rsplit('-', 1)
+            post = 'comment_post' if basename == 'comment' else 'post'
+            kwargs = {
+                name: sample[basename if name == 'pk' else post]
+                for name in pattern.pattern.regex.groupindex
+            }
+            yield (f'api:{pattern.name}',
+                   reverse(f'api:api:{pattern.name}', kwargs=kwargs), api)
+
+    @staticmethod
+    def get(client, url):
+        try:
+            return client.get(url).status_code
+        except Exception as error:
+            return type(error).__name__
+
+    def measure(self, client, url, requests, warmup, cold):
+        for _ in range(warmup):
+            self.get(client, url)
+        timings, queries, statuses = [], [], {}
+        started = time.perf_counter()
+        for _ in range(requests):
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                status = self.get(client, url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured.captured_queries))
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        elapsed = time.perf_counter() - started
+        return {
+            'url': url,
+            'requests': requests,
+            'statuses': statuses,
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries_per_request': round(statistics.mean(queries), 2),
+            'throughput_rps': round(requests / elapsed, 1),
+        }
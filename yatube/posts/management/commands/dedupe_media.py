@@ -0,0 +1,89 @@
+import os
+import posixpath
+import shutil
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from sorl.thumbnail import default
+
+from core.cache import bump_generation
+from core.db import bulk_batch_size
+from core.storage import file_digest
+from posts import cache as pages
+from posts.media import image_storage, source
+from posts.models import Post, StoredImage
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов под имена по sha256 содержимого: '
+            'одинаковые файлы остаются в одном экземпляре. Затем '
+            'пересчитывает ссылки на файлы. Превью нарежет '
+            'warm_thumbnails.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        storage = image_storage()
+        upload_to = Post._meta.get_field('image').upload_to
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True).order_by().distinct()
+        moved = merged = freed = missing = 0
+        targets = set()
+        for name in list(names):
+            if not storage.exists(name):
+                missing += 1
+                continue
+            with storage.open(name) as file:
+                target = storage.hashed_name(
+                    posixpath.join(upload_to, posixpath.basename(name)),
+                    file_digest(file))
+            if target == name:
+                continue
+            duplicate = target in targets or storage.exists(target)
+            targets.add(target)
+            merged += duplicate
+            moved += not duplicate
+            if duplicate:
+                freed += storage.size(name)
+            if options['dry_run']:
+                continue
+            self.move(storage, name, target, duplicate)
+
+        if not options['dry_run']:
+            self.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено: {moved}, совпадений: {merged}, освобождено байт: '
+            f'{freed}, файлов нет: {missing}'))
+
+    def move(self, storage, name, target, duplicate):
+        # Сначала копия под новым именем, потом ссылки, потом удаление:
+        # прерванный запуск можно просто повторить.
+        if not duplicate:
+            path = storage.path(target)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.link(storage.path(name), path)
+            except OSError:
+                shutil.copyfile(storage.path(name), path)
+        with transaction.atomic():
+            posts = Post.objects.filter(image=name)
+            ids = list(posts.values_list('pk', flat=True))
+            posts.update(image=target)
+        default.kvstore.delete(source(name))
+        storage.delete(name)
+        pages.cards_changed(posts=ids)
+
+    def recount(self):
+        counts = Post.objects.exclude(image='').order_by().values(
+            'image').annotate(total=Count('id')).values_list(
+                'image', 'total')
+        with transaction.atomic():
+            StoredImage.objects.all().delete()
+            StoredImage.objects.bulk_create(
+                (StoredImage(name=name, references=total)
+                 for name, total in counts.iterator()),
+                batch_size=bulk_batch_size(StoredImage, 1000))
+        # В закэшированных страницах остались ссылки на старые превью.
+        bump_generation(pages.CARDS)
@@ -0,0 +1,25 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Читатели, чьи ленты нужно пересобрать (по умолчанию все).')
+
+    def handle(self, *args, **options):
+        cache.delete(timeline.CELEBRITY_CACHE_KEY)
+        users = User.objects.filter(follower__isnull=False).distinct()
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+        rebuilt = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            timeline.rebuild(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Лент пересобрано: {rebuilt}'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики и исправляет расхождения.'
+
+    def handle(self, *args, **options):
+        authors, posts = reconcile()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: авторов {authors}, постов {posts}'))
@@ -0,0 +1,7 @@
+from .warm_thumbnails import Command as WarmCommand
+
+
+class Command(WarmCommand):
+    help = ('Заново кодирует все варианты картинок постов, например после '
+            'смены ширин, форматов или качества в настройках.')
+    force = True
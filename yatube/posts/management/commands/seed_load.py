@@ -0,0 +1,204 @@
+import io
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from PIL import Image
+
+from core.db import bulk_batch_size
+from posts import counters, timeline
+from posts.models import Comment, Follow, Group, Post, User
+
+WORDS = (
+    'пост лента автор группа подписка текст картинка комментарий день '
+    'город море кот собака книга кино музыка код python django база '
+    'индекс кэш страница сервер запрос ответ время память диск сеть'
+).split()
+
+
+@contextmanager
+def keep_dates(*fields):
+    """Отключает auto_now_add, чтобы bulk_create сохранил даты из данных."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Генерирует нагрузочный набор данных: пользователей, группы, '
+            'посты, комментарии и граф подписок со степенным '
+            'распределением популярности.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя.')
+        parser.add_argument(
+            '--alpha', type=float, default=1.2,
+            help='Параметр Парето для популярности авторов.')
+        parser.add_argument(
+            '--images', type=float, default=0.0,
+            help='Доля постов с картинкой, от 0 до 1.')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='load')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счётчики и ленты подписок.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = time.perf_counter()
+
+        user_ids = self.create_users(options['users'], options['prefix'])
+        group_ids = self.create_groups(options['groups'], options['prefix'])
+        cum_weights = list(accumulate(
+            self.random.paretovariate(options['alpha']) for _ in user_ids))
+        images = self.create_images() if options['images'] else []
+        self.create_posts(options['posts'], user_ids, group_ids,
+                          cum_weights, options['days'], images,
+                          options['images'])
+        self.create_follows(user_ids, cum_weights, options['follows'])
+        self.create_comments(
+            options['comments'], user_ids, options['prefix'])
+        if not options['skip_derived']:
+            self.log('Пересчёт счётчиков')
+            counters.reconcile()
+            self.log('Пересборка лент подписок')
+            readers = Follow.objects.filter(
+                user__username__startswith=f'{options["prefix"]}_user_'
+            ).values_list('user', flat=True).distinct()
+            for user_id in readers.iterator():
+                timeline.rebuild(user_id)
+        self.log('Готово')
+
+    def log(self, message):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f'[{elapsed:8.1f}s] {message}')
+
+    def bulk(self, model, objects):
+        created = 0
+        for batch in batched(
+                objects, bulk_batch_size(model, self.batch_size)):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+        self.log(f'{model.__name__}: {created}')
+
+    def words(self, low, high):
+        return ' '.join(self.random.choices(WORDS, k=self.random.randint(
+            low, high)))
+
+    def create_users(self, number, prefix):
+        self.bulk(User, (
+            User(username=f'{prefix}_user_{i}', password='!')
+            for i in range(number)
+        ))
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_user_'
+        ).values_list('id', flat=True))
+
+    def create_groups(self, number, prefix):
+        self.bulk(Group, (
+            Group(title=f'Группа {i}', slug=f'{prefix}-group-{i}',
+                  description=self.words(5, 30))
+            for i in range(number)
+        ))
+        return list(Group.objects.filter(
+            slug__startswith=f'{prefix}-group-'
+        ).values_list('id', flat=True))
+
+    def create_images(self, number=20):
+        names = []
+        for i in range(number):
+            image = Image.new('RGB', (1280, 720), tuple(
+                self.random.randrange(256) for _ in range(3)))
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=80)
+            names.append(default_storage.save(
+                f'posts/load_{i}.jpg', ContentFile(buffer.getvalue())))
+        return names
+
+    def create_posts(self, number, user_ids, group_ids, cum_weights,
+                     days, images, image_share):
+        now = timezone.now()
+        span = timedelta(days=days).total_seconds()
+
+        def posts():
+            for _ in range(number):
+                pub_date = now - timedelta(
+                    seconds=self.random.uniform(0, span))
+                yield Post(
+                    author_id=self.random.choices(
+                        user_ids, cum_weights=cum_weights)[0],
+                    group_id=(self.random.choice(group_ids)
+                              if group_ids and self.random.random() < 0.7
+                              else None),
+                    text=self.words(10, 120),
+                    pub_date=pub_date,
+                    created=pub_date,
+                    image=(self.random.choice(images)
+                           if self.random.random() < image_share else ''),
+                )
+
+        with keep_dates(Post._meta.get_field('pub_date'),
+                        Post._meta.get_field('created')):
+            self.bulk(Post, posts())
+
+    def create_follows(self, user_ids, cum_weights, average):
+        # Вероятность подписаться на автора пропорциональна его весу, так
+        # что число подписчиков распределено по степенному закону.
+        def follows():
+            for user_id in user_ids:
+                count = min(len(user_ids) - 1,
+                            int(self.random.expovariate(1 / average)))
+                authors = set(self.random.choices(
+                    user_ids, cum_weights=cum_weights, k=count))
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.bulk(Follow, follows())
+
+    def create_comments(self, number, user_ids, prefix):
+        post_ids = list(Post.objects.filter(
+            author__username__startswith=f'{prefix}_user_'
+        ).values_list('id', flat=True))
+        if not post_ids:
+            return
+
+        def comments():
+            for _ in range(number):
+                yield Comment(
+                    post_id=self.random.choice(post_ids),
+                    author_id=self.random.choice(user_ids),
+                    text=self.words(3, 40),
+                )
+
+        self.bulk(Comment, comments())
@@ -0,0 +1,40 @@
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Готовит превью для всех картинок постов в пуле процессов, '
+            'чтобы их не резали первые запросы.')
+    force = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            help='Процессов в пуле, по умолчанию THUMBNAIL_WORKERS.')
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True).order_by().distinct()
+        created = skipped = failed = 0
+        with thumbnails.make_executor(options['workers']) as executor:
+            futures = {
+                executor.submit(
+                    thumbnails.generate, name, self.force): name
+                for name in names.iterator()
+            }
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    failed += 1
+                    self.stderr.write(
+                        f'{futures[future]}: {future.exception()}')
+                elif future.result():
+                    created += 1
+                else:
+                    skipped += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок обработано: {created}, уже готовы: {skipped}, '
+            f'ошибок: {failed}'))
@@ -0,0 +1,58 @@
+"""Учёт ссылок на файлы картинок постов.
+
+Post.image хранится в PostImageStorage: одинаковые загрузки - один
+файл. StoredImage.references считает посты с этим файлом; файл и его
+превью удаляются, когда уходит последняя ссылка. Расхождения исправляет
+manage.py dedupe_media.
+"""
+from django.db import transaction
+from django.db.models import F
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post, StoredImage
+# Ссылки на загруженные файлы берёт само хранилище, acquire нужен для
+# имён, присвоенных Post.image строкой.
+from .storage import acquire  # noqa: F401
+
+
+def image_storage():
+    return Post._meta.get_field('image').storage
+
+
+def source(name):
+    """Картинка для sorl с тем же хранилищем, что у Post.image.
+
+    Ключ sorl зависит от класса хранилища, так что строка с именем
+    (хранилище sorl по умолчанию) дала бы другие ключи, чем FieldFile.
+    """
+    return ImageFile(name, image_storage())
+
+
+def release(*names):
+    """Снимает ссылки; файлы без ссылок удаляются после фиксации."""
+    names = [name for name in names if name]
+    for name in names:
+        StoredImage.objects.filter(name=name, references__gte=1).update(
+            references=F('references') - 1)
+    if names:
+        transaction.on_commit(lambda: collect(*names))
+
+
+def collect(*names):
+    """Удаляет файлы без ссылок вместе с их превью.
+
+    Файл удаляется в той же транзакции, что и запись: загрузка той же
+    картинки берёт ссылку до записи файла (PostImageStorage), поэтому
+    либо ждёт конца транзакции и кладёт файл заново, либо её ссылку
+    увидит фильтр references=0.
+    """
+    for name in names:
+        with transaction.atomic():
+            deleted, _ = StoredImage.objects.filter(
+                name=name, references=0).delete()
+            if not deleted or StoredImage.objects.filter(name=name).exists():
+                continue
+            # Удаляет и записи sorl, и файлы превью.
+            default.kvstore.delete(source(name))
+            image_storage().delete(name)
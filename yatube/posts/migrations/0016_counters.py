@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+
+    def counts(queryset, field):
+        return dict(queryset.order_by().values_list(field).annotate(
+            total=Count('pk')))
+
+    posts = counts(Post.objects, 'author')
+    comments = counts(Comment.objects, 'author')
+    followers = counts(Follow.objects, 'author')
+    following = counts(Follow.objects, 'user')
+    AuthorStats.objects.bulk_create((
+        AuthorStats(
+            user_id=user_id,
+            posts_count=posts.get(user_id, 0),
+            comments_count=comments.get(user_id, 0),
+            followers_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+        ) for user_id in User.objects.values_list('pk', flat=True)
+    ), batch_size=500)
+    for post_id, total in counts(Comment.objects, 'post').items():
+        Post.objects.filter(pk=post_id).update(comments_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='постов')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='комментариев')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики автора',
+                'verbose_name_plural': 'Счётчики авторов',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_comment_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(_negated=True, image=''), fields=['-pub_date', '-id'], name='post_image_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(image=''), fields=['-pub_date', '-id'], name='post_no_image_pub_date_idx'),
+        ),
+    ]
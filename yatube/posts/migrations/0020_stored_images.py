@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:15
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_references(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    StoredImage = apps.get_model('posts', 'StoredImage')
+    StoredImage.objects.bulk_create(
+        StoredImage(name=row['image'], references=row['total'])
+        for row in Post.objects.exclude(image='').order_by().values(
+            'image').annotate(total=Count('id'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_image_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='файл')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
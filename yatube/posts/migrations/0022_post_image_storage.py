@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:44
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_comment_follow_verbose_names'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.PostImageStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+    ]
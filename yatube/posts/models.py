@@ -1,9 +1,10 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from core.models import CreatedModel
 
 from .settings import SLICE
+from .storage import PostImageStorage
 User = get_user_model()
 
 
@@ -36,16 +37,54 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=PostImageStorage(),
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        _('число комментариев'), default=0, editable=False)
 
     def __str__(self):
         return self.text[:SLICE]
 
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        # comments_count меняют только UPDATE ... F() из posts.counters:
+        # обычное сохранение записало бы поверх значение на момент чтения.
+        if (update_fields is None and not force_insert
+                and not self._state.adding):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'comments_count'
+                and field.attname not in deferred]
+        if not self.image or self.image._committed:
+            super().save(force_insert, force_update, using, update_fields)
+            return
+        # Ссылку на загруженную картинку хранилище берёт ещё до INSERT:
+        # если пост не сохранится, она откатится вместе с ним.
+        with transaction.atomic(using=using):
+            super().save(force_insert, force_update, using, update_fields)
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = _('Пост')
         verbose_name_plural = _('Посты')
+        indexes = (
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            # Частичные индексы для фильтра has_image в API: каждый пост
+            # попадает ровно в один из них.
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_image_pub_date_idx',
+                         condition=~models.Q(image='')),
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_no_image_pub_date_idx',
+                         condition=models.Q(image='')),
+        )
 
 
 class Comment(CreatedModel):
@@ -72,6 +111,10 @@ class Comment(CreatedModel):
         ordering = ['-created']
         verbose_name = ('Коммент')
         verbose_name_plural = ('Комменты')
+        indexes = (
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created_id_idx'),
+        )
 
 
 class Follow(models.Model):
@@ -100,3 +143,82 @@ class Follow(models.Model):
                 name='unique_user_author'
             ),
         )
+        indexes = (
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        )
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок читателя, заполняется при публикации."""
+    user = models.ForeignKey(
+        User,
+        verbose_name='Читатель',
+        related_name='timeline',
+        on_delete=models.CASCADE,
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+    )
+    pub_date = models.DateTimeField(_('дата публикации'))
+
+    def __str__(self):
+        return f'{self.user_id} {self.post_id}'
+
+    class Meta:
+        verbose_name = ('Запись ленты')
+        verbose_name_plural = ('Записи ленты')
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_user_post'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+        )
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, обновляются сигналами (posts.counters)."""
+    user = models.OneToOneField(
+        User,
+        verbose_name='Пользователь',
+        related_name='stats',
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    posts_count = models.PositiveIntegerField(_('постов'), default=0)
+    comments_count = models.PositiveIntegerField(_('комментариев'), default=0)
+    followers_count = models.PositiveIntegerField(_('подписчиков'), default=0)
+    following_count = models.PositiveIntegerField(_('подписок'), default=0)
+
+    def __str__(self):
+        return str(self.user_id)
+
+    class Meta:
+        verbose_name = ('Счётчики автора')
+        verbose_name_plural = ('Счётчики авторов')
+
+
+class StoredImage(models.Model):
+    """Число постов, которые ссылаются на файл картинки (posts.media).
+
+    Одинаковые загрузки хранятся одним файлом, и удалять его можно,
+    только когда ссылок не осталось.
+    """
+    name = models.CharField(_('файл'), max_length=100, primary_key=True)
+    references = models.PositiveIntegerField(_('ссылок'), default=0)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = _('Файл картинки')
+        verbose_name_plural = _('Файлы картинок')
@@ -0,0 +1,121 @@
+import base64
+import binascii
+from collections.abc import Sequence
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .settings import NUMBER_POSTS
+
+CURSOR_SEPARATOR = '|'
+
+
+def encode_cursor(pub_date, pk):
+    """Непрозрачный курсор из пары (pub_date, id)."""
+    raw = f'{pub_date.isoformat()}{CURSOR_SEPARATOR}{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (pub_date, id) или None для битого курсора."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(
+            cursor + '=' * (-len(cursor) % 4)).decode()
+        pub_date, pk = raw.rsplit(CURSOR_SEPARATOR, 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+def keyset_filter(posts, position, reverse=False,
+                  date_field='pub_date', pk_field='id'):
+    """Посты строго после (или до при reverse) позиции в ленте.
+
+    Лента упорядочена по (-pub_date, -id), поэтому следующая страница -
+    это всё, что старше курсора, а предыдущая - всё, что новее.
+    """
+    if reverse:
+        ordering = (date_field, pk_field)
+        lookup = 'gt'
+    else:
+        ordering = (f'-{date_field}', f'-{pk_field}')
+        lookup = 'lt'
+    if position is not None:
+        pub_date, pk = position
+        posts = posts.filter(
+            Q(**{f'{date_field}__{lookup}': pub_date})
+            | Q(**{date_field: pub_date, f'{pk_field}__{lookup}': pk})
+        )
+    return posts.order_by(*ordering)
+
+
+class KeysetPage(Sequence):
+    """Страница ленты без COUNT(*) и OFFSET.
+
+    Повторяет ту часть интерфейса Page, которой пользуются шаблоны.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self)} items>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def get_keyset_page(params, posts, per_page=NUMBER_POSTS,
+                    position_of=None):
+    """Страница ленты по курсорам ?before= / ?after=.
+
+    posts - queryset, либо функция fetch(position, reverse, limit),
+    возвращающая объекты в порядке обхода (для лент, которые собираются
+    не одним запросом). position_of(obj) отдаёт пару (pub_date, id).
+    """
+    if position_of is None:
+        def position_of(obj):
+            return obj.pub_date, obj.pk
+    if callable(posts):
+        fetch = posts
+    else:
+        def fetch(position, reverse, limit):
+            return list(keyset_filter(posts, position, reverse)[:limit])
+
+    after = decode_cursor(params.get('after'))
+    before = None if after else decode_cursor(params.get('before'))
+    reverse = after is not None
+    rows = fetch(after if reverse else before, reverse, per_page + 1)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+    if not rows:
+        return KeysetPage(rows)
+
+    next_cursor = previous_cursor = None
+    if has_more or reverse:
+        next_cursor = encode_cursor(*position_of(rows[-1]))
+    if (has_more and reverse) or (not reverse and before is not None):
+        previous_cursor = encode_cursor(*position_of(rows[0]))
+    return KeysetPage(rows, next_cursor, previous_cursor)
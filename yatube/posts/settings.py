@@ -1,3 +1,33 @@
 NUMBER_POSTS = 10
-INDEX_PAGE_CACHE_DURATION = 20
+# Страницы лент сбрасываются по сигналам, поэтому живут долго
+INDEX_PAGE_CACHE_DURATION = 6 * 60 * 60
+FEED_PAGE_CACHE_DURATION = 6 * 60 * 60
 SLICE = 15
+KEYSET_PAGINATION = True
+# Материализованная лента подписок (fan-out on write)
+TIMELINE_SIZE = 1000
+FANOUT_MAX_FOLLOWERS = 5000
+FANOUT_BATCH_SIZE = 1000
+CELEBRITY_CACHE_DURATION = 300
+# Превью картинок постов: кроп с пропорциями THUMBNAIL_RATIO в
+# нескольких ширинах и форматах для srcset. Все варианты готовятся в фоне
+# сразу после загрузки (posts/thumbnails.py).
+THUMBNAIL_RATIO = (960, 339)
+THUMBNAIL_WIDTHS = (320, 640, 960)
+# None - формат оригинала. WebP пропускается, если Pillow собран без него.
+THUMBNAIL_FORMATS = ('WEBP', None)
+THUMBNAIL_SIZES = '(max-width: 960px) 100vw, 960px'
+# 0 - без пула: превью режутся сразу в текущем процессе
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_JOB_TIMEOUT = 5 * 60
+# LRU записей хранилища ключей sorl в памяти процесса
+THUMBNAIL_LRU_SIZE = 10000
+THUMBNAIL_LRU_TIMEOUT = 5 * 60
+# Приём картинок (posts/images.py). Картинки, обработка которых займёт
+# больше INGEST_MAX_MEMORY, отклоняются до раскодирования.
+INGEST_MAX_BYTES = 20 * 1024 * 1024
+INGEST_MAX_PIXELS = 50 * 1000 * 1000
+INGEST_MAX_MEMORY = 128 * 1024 * 1024
+INGEST_MAX_SIZE = 2048
+INGEST_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+INGEST_JPEG_QUALITY = 85
@@ -0,0 +1,164 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, counters, media, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out([instance])
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_previous(sender, instance, raw=False, **kwargs):
+    # При переносе поста в другую группу устаревает и старая страница,
+    # а превью нужно резать только для новой картинки.
+    instance._previous_group_slug = instance._previous_image = None
+    # Ссылку на новый загруженный файл возьмёт PostImageStorage.
+    instance._image_uploaded = bool(
+        instance.image) and not instance.image._committed
+    if instance.pk and not raw:
+        instance._previous_group_slug, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group__slug', 'image').first() or (None, None))
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, raw=False, **kwargs):
+    image = instance.image.name
+    if raw:
+        return
+    if image == instance._previous_image:
+        if instance._image_uploaded:
+            # Тот же файл загрузили заново: хранилище взяло лишнюю ссылку.
+            media.release(image)
+        return
+    if not instance._image_uploaded:
+        media.acquire(image)
+    media.release(instance._previous_image)
+    thumbnails.forget(instance._previous_image)
+    thumbnails.schedule(image)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    group = instance.group
+    previous = getattr(instance, '_previous_group_slug', None)
+    cache.posts_changed(
+        [instance.author.username], {group and group.slug, previous},
+        posts=[instance.pk]
+    )
+    cache.cards_changed(posts=[instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    # В профиле автора выводится число его комментариев.
+    cache.author_changed(instance.author.username)
+    cache.comments_changed(instance.post_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    cache.group_changed(instance.slug)
+    cache.cards_changed(groups=[instance.pk])
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    timeline.unfollow(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    # Счётчики подписок и кнопка подписки в профилях обоих.
+    cache.author_changed(instance.user.username, instance.author.username)
+
+
+# Поля пользователя, которые выводятся в карточках постов и комментариев.
+CARD_USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def user_remember_previous(sender, instance, raw=False, update_fields=None,
+                           **kwargs):
+    instance._previous_names = None
+    if update_fields is not None and not set(update_fields) & set(
+            CARD_USER_FIELDS):
+        return
+    if instance.pk and not raw:
+        instance._previous_names = User.objects.filter(
+            pk=instance.pk).values_list(*CARD_USER_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Пароль, last_login и прочие поля в карточки не попадают, а сброс
+    # CARDS устаревает все страницы лент.
+    previous = getattr(instance, '_previous_names', None)
+    if created or previous is None:
+        return
+    names = tuple(getattr(instance, field) for field in CARD_USER_FIELDS)
+    if names == previous:
+        return
+    if not (instance.posts.exists() or instance.comments.exists()):
+        return
+    cache.author_renamed(instance.username)
+    if previous[0] != instance.username:
+        cache.author_changed(previous[0])
+    cache.cards_changed(authors=[instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def post_count_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.add_to_author(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def post_image_removed(sender, instance, **kwargs):
+    media.release(instance.image.name)
+    thumbnails.forget(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def post_count_removed(sender, instance, **kwargs):
+    counters.add_to_author(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_count_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.add_to_author(instance.author_id, comments_count=1)
+        counters.add_to_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_count_removed(sender, instance, **kwargs):
+    counters.add_to_author(instance.author_id, comments_count=-1)
+    counters.add_to_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_count_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.add_to_author(instance.author_id, followers_count=1)
+        counters.add_to_author(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_count_removed(sender, instance, **kwargs):
+    counters.add_to_author(instance.author_id, followers_count=-1)
+    counters.add_to_author(instance.user_id, following_count=-1)
@@ -0,0 +1,31 @@
+"""Хранилище картинок постов со счётчиком ссылок на файл.
+
+Ссылка в StoredImage берётся до того, как файл встаёт на своё имя, и в
+одной транзакции с этим: collect (posts.media), который удаляет файлы
+без ссылок, либо увидит ссылку, либо успеет удалить старый файл раньше,
+чем загрузка положит новый. Если пост не сохранится, ссылка откатится
+вместе с его транзакцией (Post.save).
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from core.storage import ContentAddressedStorage
+
+
+def acquire(*names):
+    StoredImage = apps.get_model('posts', 'StoredImage')
+    for name in filter(None, names):
+        images = StoredImage.objects.filter(name=name)
+        if not images.update(references=F('references') + 1):
+            StoredImage.objects.get_or_create(name=name)
+            images.update(references=F('references') + 1)
+
+
+@deconstructible
+class PostImageStorage(ContentAddressedStorage):
+    def place(self, temporary, name):
+        with transaction.atomic():
+            acquire(name)
+            super().place(temporary, name)
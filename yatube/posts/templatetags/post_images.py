@@ -0,0 +1,12 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image):
+    """Варианты картинки поста для <picture>, см. includes/post_image.html.
+    """
+    return thumbnails.responsive(image) if image else None
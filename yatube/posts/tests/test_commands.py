@@ -0,0 +1,33 @@
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import AuthorStats, Comment, Follow, Post, TimelineEntry
+
+
+class LoadCommandsTests(TestCase):
+    def test_seed_load_and_bench_views(self):
+        call_command('seed_load', users=20, groups=3, posts=200,
+                     comments=100, follows=5, seed=1, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list('posts_count', flat=True)),
+            200)
+        self.assertEqual(
+            Post.objects.values('pub_date').distinct().count(), 200)
+
+        cache.clear()
+        output = StringIO()
+        call_command('bench_views', requests=2, warmup=0,
+                     route=['posts:index', 'api:post-detail'],
+                     stdout=output, stderr=StringIO())
+        report = json.loads(output.getvalue())['routes']
+        self.assertEqual(set(report), {'posts:index', 'api:post-detail'})
+        self.assertEqual(report['posts:index']['statuses'], {'200': 2})
+        self.assertIn('p99_ms', report['api:post-detail'])
@@ -23,6 +23,8 @@ SMAIL_GIF = (
     b'\x0A\x00\x3B'
 )
 LOGIN = reverse('users:login')
+# Картинки хранятся под sha256 содержимого (core.storage)
+HASHED_GIF = r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -98,8 +100,7 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(Post.objects.count(), 1)
         post_create = Post.objects.get()
         self.assertEqual(form_data['text'], post_create.text)
-        self.assertEqual(
-            f"posts/{form_data['image'].name}", post_create.image.name)
+        self.assertRegex(post_create.image.name, HASHED_GIF)
         self.assertEqual(form_data['group'], post_create.group.id)
         self.assertEqual(post_create.author.username,
                          self.post.author.username)
@@ -124,8 +125,7 @@ class PostCreateFormTests(TestCase):
         )
         post = Post.objects.get(id=self.post.id)
         self.assertEqual(form_data['text'], post.text)
-        self.assertEqual(
-            f"posts/{form_data['image'].name}", post.image.name)
+        self.assertRegex(post.image.name, HASHED_GIF)
         self.assertEqual(form_data['group'], post.group.id)
         self.assertEqual(post.author.username, self.post.author.username)
         self.assertRedirects(response, self.POST_DETAIL)
@@ -0,0 +1,145 @@
+import io
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import zlib
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from posts.images import ingest
+from posts.models import Post, User
+from posts.settings import INGEST_MAX_MEMORY, INGEST_MAX_SIZE
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+# Пиковая память ingest в отдельном процессе, в КБ. ru_maxrss не
+# годится: после exec он наследует пик родителя, а VmHWM - нет.
+MEASURE = '''
+import sys
+from django.core.files import File
+from posts.images import ingest
+
+def status(field):
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith(field):
+                return int(line.split()[1])
+
+before = status('VmRSS')
+with open(sys.argv[1], 'rb') as file:
+    ingest(File(file, name='big.jpg'))
+print(status('VmHWM') - before)
+'''
+
+
+def jpeg(size, orientation=None):
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera'
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(
+        buffer, 'JPEG', quality=90, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def png_chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data)))
+
+
+def png_bomb(width, height):
+    """Заголовок PNG с огромными размерами и почти без данных."""
+    return (b'\x89PNG\r\n\x1a\n'
+            + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                             8, 2, 0, 0, 0))
+            + png_chunk(b'IDAT', zlib.compress(b'\x00'))
+            + png_chunk(b'IEND', b''))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageIngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+        cls.big = jpeg((6000, 4000), orientation=6)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_downscales_and_strips_metadata(self):
+        result = ingest(SimpleUploadedFile('big.jpg', self.big))
+        image = Image.open(result)
+        self.assertEqual(result.name, 'big.jpg')
+        self.assertEqual(image.format, 'JPEG')
+        # Поворот из EXIF применён к пикселям.
+        self.assertEqual(image.size, (1365, INGEST_MAX_SIZE))
+        self.assertEqual(dict(image.getexif()), {})
+        self.assertNotIn('exif', image.info)
+
+    @skipUnless(os.path.exists('/proc/self/status'), 'нужен Linux')
+    def test_peak_memory_is_bounded(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as file:
+            file.write(self.big)
+            file.flush()
+            peak = int(subprocess.run(
+                [sys.executable, '-c', MEASURE, file.name],
+                cwd=settings.BASE_DIR, check=True, capture_output=True,
+                text=True).stdout)
+        self.assertLess(peak * 1024, INGEST_MAX_MEMORY)
+        # Одно только полное раскодирование заняло бы 6000 * 4000 * 4.
+        self.assertLess(peak * 1024, 6000 * 4000 * 4 * 0.6)
+
+    def test_rejects_decompression_bomb(self):
+        # Пиксели сверх лимита Pillow, INGEST_MAX_PIXELS и память.
+        for width, height in ((100000, 100000), (10000, 6000),
+                              (6000, 5000)):
+            with self.subTest(size=(width, height)):
+                with self.assertRaises(ValidationError) as error:
+                    ingest(SimpleUploadedFile(
+                        'bomb.png', png_bomb(width, height)))
+                self.assertEqual(error.exception.code, 'decompression_bomb')
+
+    def test_post_form_ingests_upload(self):
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('posts:post_create'), {
+            'text': 'Большое фото',
+            'image': SimpleUploadedFile('photo.jpg', jpeg((3000, 1000))),
+        })
+        post = Post.objects.get(text='Большое фото')
+        self.assertRegex(post.image.name, r'^posts/\w\w/\w{64}\.jpg$')
+        image = Image.open(post.image)
+        self.assertEqual(image.size, (INGEST_MAX_SIZE, 683))
+        self.assertEqual(dict(image.getexif()), {})
+
+    def test_api_ingests_and_rejects(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/v1/posts/', {
+            'text': 'Через API',
+            'image': SimpleUploadedFile('api.jpg', jpeg((1000, 3000))),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        image = Image.open(Post.objects.get(text='Через API').image)
+        self.assertEqual(image.size, (683, INGEST_MAX_SIZE))
+
+        response = client.post('/api/v1/posts/', {
+            'text': 'Бомба',
+            'image': SimpleUploadedFile('bomb.png', png_bomb(50000, 50000)),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.json())
+        self.assertFalse(Post.objects.filter(text='Бомба').exists())
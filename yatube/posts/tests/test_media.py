@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+
+from posts import media, thumbnails
+from posts.models import Post, StoredImage, User
+from posts.storage import PostImageStorage
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+HASHED_GIF = r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='memer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.reset()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        os.makedirs(TEMP_MEDIA_ROOT)
+
+    def create_post(self, name='meme.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user, text='text',
+            image=SimpleUploadedFile(name, content, 'image/gif'))
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), TEMP_MEDIA_ROOT)
+            for root, _, names in os.walk(
+                os.path.join(TEMP_MEDIA_ROOT, 'posts'))
+            for name in names)
+
+    def references(self, post):
+        return StoredImage.objects.get(name=post.image.name).references
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.create_post('meme.gif')
+        second = self.create_post('repost.GIF')
+        self.assertRegex(first.image.name, HASHED_GIF)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.files(), [first.image.name])
+        self.assertEqual(self.references(first), 2)
+
+        # Превью второго поста уже готовы.
+        self.assertTrue(thumbnails.generate(first.image.name))
+        self.assertFalse(thumbnails.generate(second.image.name))
+
+    def test_file_is_deleted_with_last_reference(self):
+        first = self.create_post()
+        second = self.create_post()
+        thumbnails.generate(first.image.name)
+        thumbnail_files = len(os.listdir(TEMP_MEDIA_ROOT))
+        first.delete()
+        media.collect(first.image.name)
+        self.assertEqual(self.files(), [second.image.name])
+        self.assertEqual(self.references(second), 1)
+        second.delete()
+        media.collect(second.image.name)
+        self.assertEqual(self.files(), [])
+        self.assertFalse(StoredImage.objects.exists())
+        self.assertLessEqual(len(os.listdir(TEMP_MEDIA_ROOT)),
+                             thumbnail_files)
+        self.assertEqual(
+            [name for _, _, names in os.walk(
+                os.path.join(TEMP_MEDIA_ROOT, 'cache')) for name in names],
+            [])
+
+    def test_upload_before_collect_keeps_file(self):
+        first = self.create_post()
+        first.delete()
+        second = self.create_post()
+        media.collect(first.image.name)
+        self.assertEqual(self.files(), [second.image.name])
+        self.assertEqual(self.references(second), 1)
+
+    def test_collect_between_file_write_and_insert(self):
+        first = self.create_post()
+        first.delete()
+        place = PostImageStorage.place
+
+        def place_then_collect(storage, temporary, name):
+            # Другой запрос фиксирует удаление первого поста, пока этот
+            # ещё не вставил свой.
+            place(storage, temporary, name)
+            media.collect(name)
+
+        with patch.object(PostImageStorage, 'place', place_then_collect):
+            second = self.create_post()
+        self.assertEqual(self.files(), [second.image.name])
+        self.assertEqual(self.references(second), 1)
+
+    def test_failed_save_releases_reference(self):
+        with patch('posts.signals.timeline.fan_out',
+                   side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.create_post()
+        self.assertFalse(StoredImage.objects.filter(references__gt=0))
+
+    def test_replaced_image_is_released(self):
+        post = self.create_post()
+        old = post.image.name
+        post.image = SimpleUploadedFile(
+            'other.gif', SMALL_GIF.replace(b'\xFF', b'\xFE'), 'image/gif')
+        post.save()
+        # TestCase не фиксирует транзакцию, on_commit не срабатывает.
+        media.collect(old)
+        self.assertNotEqual(post.image.name, old)
+        self.assertEqual(self.files(), [post.image.name])
+        self.assertFalse(StoredImage.objects.filter(name=old).exists())
+
+    def test_dedupe_media(self):
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        for name in ('a.gif', 'b.gif'):
+            with open(os.path.join(TEMP_MEDIA_ROOT, 'posts', name),
+                      'wb') as file:
+                file.write(SMALL_GIF)
+        first = Post.objects.create(
+            author=self.user, text='a', image='posts/a.gif')
+        second = Post.objects.create(
+            author=self.user, text='b', image='posts/b.gif')
+        output = StringIO()
+        call_command('dedupe_media', dry_run=True, stdout=output)
+        self.assertIn('Перенесено: 1, совпадений: 1', output.getvalue())
+        self.assertEqual(len(self.files()), 2)
+
+        call_command('dedupe_media', stdout=output)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertRegex(first.image.name, HASHED_GIF)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.files(), [first.image.name])
+        self.assertEqual(self.references(first), 2)
+
+        output = StringIO()
+        call_command('dedupe_media', stdout=output)
+        self.assertIn('Перенесено: 0, совпадений: 0', output.getvalue())
@@ -1,6 +1,7 @@
 from django.test import TestCase
 
-from ..models import Group, Post, User, Comment, Follow
+from ..counters import reconcile
+from ..models import AuthorStats, Group, Post, User, Comment, Follow
 from ..settings import SLICE
 
 
@@ -49,3 +50,58 @@ class PostModelTest(TestCase):
         following = PostModelTest.follow.user.username
         author = PostModelTest.follow.author.username
         self.assertEqual(str(self.follow), f'{author} {following}')
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='avtor')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Коммент')
+        Follow.objects.create(user=self.user, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).comments_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        comment.delete()
+        Follow.objects.all().delete()
+        post.delete()
+        stats = self.stats(self.author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (0, 0))
+        self.assertEqual(self.stats(self.user).comments_count, 0)
+
+    def test_saving_post_keeps_comments_count(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        post.text = 'Правка'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual((post.text, post.comments_count), ('Правка', 1))
+
+    def test_reconcile_repairs_drift(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        self.assertEqual(reconcile(), (1, 1))
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(reconcile(), (0, 0))
+
+    def test_user_deletion_keeps_counters_consistent(self):
+        Post.objects.create(text='Пост', author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        author_id = self.author.pk
+        self.author.delete()
+        self.assertFalse(AuthorStats.objects.filter(user=author_id))
+        self.assertEqual(self.stats(self.user).following_count, 0)
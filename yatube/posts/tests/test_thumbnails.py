@@ -0,0 +1,150 @@
+import io
+import json
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+
+from posts import thumbnails
+from posts.models import Post, User
+from posts.settings import THUMBNAIL_WIDTHS
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def gif(shade=0):
+    """Маленький GIF: разные shade дают разное содержимое."""
+    if not shade:
+        return SMALL_GIF
+    buffer = io.BytesIO()
+    Image.new('L', (2, 1), shade).save(buffer, 'GIF')
+    return buffer.getvalue()
+
+
+# Без пула: дочерние процессы открыли бы не тестовую БД, а настоящую.
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@patch('posts.thumbnails.THUMBNAIL_WORKERS', 0)
+@patch('posts.thumbnails._executor', None)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='painter')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.reset()
+
+    def create_post(self, name='small.gif', shade=0):
+        return Post.objects.create(
+            author=self.user, text='text',
+            image=SimpleUploadedFile(name, gif(shade), 'image/gif'))
+
+    @patch('posts.thumbnails.schedule')
+    def test_saving_image_schedules_thumbnails(self, schedule):
+        post = self.create_post()
+        post.text = 'new text'
+        post.save()
+        schedule.assert_called_once_with(post.image.name)
+
+    def test_submit_generates_once(self):
+        post = self.create_post()
+        with patch('posts.thumbnails.generate') as generate:
+            thumbnails.submit(post.image.name)
+            thumbnails.submit(post.image.name)
+        generate.assert_called_once_with(post.image.name)
+
+    @patch('posts.thumbnails.schedule')
+    def test_template_falls_back_to_placeholder(self, schedule):
+        post = self.create_post()
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        content = Client().get(url).content.decode()
+        self.assertIn('src="data:image/svg+xml,', content)
+        self.assertIn('width="960" height="339"', content)
+        self.assertNotIn('srcset', content)
+        schedule.assert_called_with(post.image.name)
+
+        self.assertTrue(thumbnails.generate(post.image.name))
+        content = Client().get(url).content.decode()
+        self.assertNotIn('data:image/svg+xml', content)
+        self.assertIn(f'src="{settings.MEDIA_URL}cache/', content)
+        for width in THUMBNAIL_WIDTHS:
+            self.assertIn(f' {width}w', content)
+        self.assertIn('sizes="(max-width: 960px)', content)
+
+    def test_warm_thumbnails(self):
+        self.create_post('first.gif', 1)
+        self.create_post('second.gif', 2)
+        output = StringIO()
+        call_command('warm_thumbnails', stdout=output)
+        self.assertIn('обработано: 2, уже готовы: 0', output.getvalue())
+        call_command('warm_thumbnails', stdout=output)
+        self.assertIn('обработано: 0, уже готовы: 2', output.getvalue())
+        output = StringIO()
+        call_command('reencode_images', stdout=output)
+        self.assertIn('обработано: 2, уже готовы: 0', output.getvalue())
+
+    def test_bench_image_bytes(self):
+        self.create_post()
+        output = StringIO()
+        call_command('bench_image_bytes', viewport=[320, 1280],
+                     stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(report['posts'], 1)
+        mobile = report['viewports']['320']
+        self.assertLess(mobile['original'], report['legacy_bytes'])
+        self.assertEqual(report['viewports']['1280']['original'],
+                         report['legacy_bytes'])
+
+    def test_feed_reads_thumbnails_from_local_lru(self):
+        posts = [self.create_post(f'feed{i}.gif', i + 1) for i in range(10)]
+        for post in posts:
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        default.kvstore.reset()
+        Client().get(reverse('posts:index'))
+        self.assertEqual(default.kvstore.stats()['misses'],
+                         10 * len(thumbnails.VARIANTS))
+
+        cache.clear()
+        with patch.object(KVStore, '_get_raw',
+                          side_effect=AssertionError('external lookup')):
+            content = Client().get(reverse('posts:index')).content.decode()
+        self.assertEqual(content.count(f'src="{settings.MEDIA_URL}cache/'),
+                         10)
+        self.assertEqual(default.kvstore.stats()['hits'],
+                         10 * len(thumbnails.VARIANTS))
+
+    def test_changed_image_is_forgotten(self):
+        post = self.create_post('old.gif')
+        thumbnails.generate(post.image.name)
+        for geometry, options in thumbnails.VARIANTS.values():
+            thumbnails.backend.get_cached(post.image, geometry, **options)
+        self.assertEqual(default.kvstore.stats()['size'],
+                         len(thumbnails.VARIANTS) + 2)
+        post.image = SimpleUploadedFile('new.gif', gif(1), 'image/gif')
+        post.save()
+        self.assertEqual(default.kvstore.stats()['size'], 0)
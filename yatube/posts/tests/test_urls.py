@@ -1,8 +1,10 @@
+from django.core.cache import cache
 from django.test import TestCase, Client
 from django.urls import reverse
 
 from http import HTTPStatus
 
+from core.testing import QueryBudgetMixin
 from ..models import Post, Group, User
 
 AUTHOR_USERNAME = 'author'
@@ -39,7 +41,7 @@ PROFILE_FOLLOWER_URL = reverse('posts:profile',
 LOGIN_UNFOLLOR = f'{LOGIN}?next={UNFOLLOWING_URL}'
 
 
-class PostURLTests(TestCase):
+class PostURLTests(QueryBudgetMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -151,3 +153,26 @@ class PostURLTests(TestCase):
                               address=address, client=client):
                 response = client.get(address)
                 self.assertRedirects(response, destination)
+
+    def test_urls_query_budget(self):
+        """Число запросов к БД на странице не зависит от данных."""
+        budgets = [
+            [INDEX, self.guest_client, 2],
+            [GROUP, self.guest_client, 2],
+            [PROFILE, self.guest_client, 2],
+            # Плюс автор поста для валидаторов условного GET.
+            [self.POST_DETAIL, self.guest_client, 3],
+            [CREATE, self.authorized_client, 3],
+            [self.POST_EDIT, self.authorized_client, 5],
+            [FOLLOW_INDEX_URL, self.follower_client, 4],
+        ]
+        for url, client, budget in budgets:
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertMaxQueries(budget):
+                    client.get(url)
+
+    def test_server_timing_header(self):
+        response = self.guest_client.get(INDEX)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
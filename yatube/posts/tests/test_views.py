@@ -1,9 +1,15 @@
+from unittest.mock import patch
+
+from django.conf import settings
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from ..models import User, Post, Group, Follow
+from core.testing import assert_indexed
+from ..models import User, Post, Group, Follow, TimelineEntry, Comment
 from ..settings import NUMBER_POSTS
 
 
@@ -183,14 +189,212 @@ class PaginatorViewsTest(TestCase):
                 )
 
     def test_index_page_caching(self):
+        cache.clear()
         response1 = self.guest_client.get(INDEX)
+        with self.assertNumQueries(0):
+            response2 = self.guest_client.get(INDEX)
+        # Запись в обход сигналов не сбрасывает кэш
+        Post.objects.filter(author=self.user).update(text='Обновлённый')
+        response3 = self.guest_client.get(INDEX)
         Post.objects.create(
             author=self.follower,
             text='Тестовый текст',
             group=self.group,
         )
-        response2 = self.guest_client.get(INDEX)
-        cache.clear()
-        response3 = self.guest_client.get(INDEX)
+        response4 = self.guest_client.get(INDEX)
         self.assertEqual(response1.content, response2.content)
-        self.assertNotEqual(response2.content, response3.content)
+        self.assertEqual(response2.content, response3.content)
+        self.assertNotEqual(response3.content, response4.content)
+
+    def test_feed_generations(self):
+        cache.clear()
+        urls = [INDEX, GROUP, PROFILE]
+        before = [self.guest_client.get(url).content for url in urls]
+        Post.objects.create(author=self.user, text='Новый', group=self.group)
+        for url, content in zip(urls, before):
+            with self.subTest(url=url):
+                self.assertNotEqual(self.guest_client.get(url).content,
+                                    content)
+
+    def test_post_card_fragment_cache(self):
+        cache.clear()
+        post = Post.objects.filter(author=self.user).first()
+        self.guest_client.get(INDEX)
+        # Карточка берётся из кэша, даже если страница группы новая
+        Post.objects.filter(pk=post.pk).update(text='Тихая правка')
+        self.assertNotContains(self.guest_client.get(GROUP), 'Тихая правка')
+        post.text = 'Правка через save'
+        post.save()
+        self.assertContains(self.guest_client.get(GROUP), 'Правка через save')
+        self.user.first_name = 'Лев'
+        self.user.save()
+        self.assertContains(self.guest_client.get(GROUP), 'Лев')
+
+    def test_user_save_without_new_names_keeps_pages(self):
+        author = User.objects.get(pk=self.user.pk)
+        reader = User.objects.create_user(username='silent')
+        with patch('posts.signals.cache.author_renamed') as author_renamed:
+            author.set_password('new-password')
+            author.save()
+            reader.first_name = 'Читатель'
+            reader.save()
+        author_renamed.assert_not_called()
+
+    def test_conditional_get(self):
+        cache.clear()
+        post = Post.objects.filter(author=self.user).first()
+        post_detail = reverse('posts:post_detail', args=[post.pk])
+        for url, queries in [[INDEX, 0], [GROUP, 0], [PROFILE, 0],
+                             [post_detail, 1]]:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                with self.assertNumQueries(queries):
+                    self.assertEqual(self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    ).status_code, 304)
+                self.assertEqual(self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                ).status_code, 304)
+                # Другой пользователь получает свою страницу.
+                self.assertEqual(self.user_client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                ).status_code, 200)
+        etag = self.guest_client.get(post_detail)['ETag']
+        Comment.objects.create(post=post, author=self.follower, text='Новый')
+        self.assertEqual(self.guest_client.get(
+            post_detail, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_conditional_get_follows_csrf_token(self):
+        post_detail = reverse(
+            'posts:post_detail',
+            args=[Post.objects.filter(author=self.user).first().pk])
+        etag = self.user_client.get(post_detail)['ETag']
+        self.assertEqual(self.user_client.get(
+            post_detail, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # После нового входа токен другой: форму комментария со старым
+        # токеном оставлять у клиента нельзя.
+        del self.user_client.cookies[settings.CSRF_COOKIE_NAME]
+        self.assertEqual(self.user_client.get(
+            post_detail, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.follower, text='Коммент')
+            for post in Post.objects.all())
+        post_detail = reverse(
+            'posts:post_detail', args=[Post.objects.first().pk])
+        # Сессия и пользователь + запросы самой страницы
+        urls = [[INDEX, 3], [GROUP, 4], [PROFILE, 5], [FOLLOW, 4],
+                [post_detail, 5]]
+        for url, queries in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    self.user_client.get(url)
+
+    def test_keyset_page(self):
+        cache.clear()
+        for url in [INDEX, GROUP, PROFILE, FOLLOW]:
+            with self.subTest(url=url):
+                first = self.user_client.get(url).context['page_obj']
+                self.assertEqual(len(first), NUMBER_POSTS)
+                self.assertFalse(first.has_previous())
+                second = self.user_client.get(
+                    url, {'before': first.next_cursor}).context['page_obj']
+                self.assertEqual(len(second), 1)
+                self.assertFalse(second.has_next())
+                self.assertNotIn(second[0], first)
+                back = self.user_client.get(
+                    url, {'after': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+
+    def test_keyset_page_without_count(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(INDEX)
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries.captured_queries))
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.reader = User.objects.create_user(username=FOLLOWER)
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+        cls.client_reader = Client()
+        cls.client_reader.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self):
+        return list(self.client_reader.get(FOLLOW).context['page_obj'])
+
+    def test_follow_backfills_and_post_fans_out(self):
+        self.client_reader.get(FOLLOWING_URL)
+        self.assertEqual(self.feed(), [self.old_post])
+        post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(self.feed(), [post, self.old_post])
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists())
+
+    def test_unfollow_removes_entries(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client_reader.get(UNFOLLOWING_URL)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.feed(), [])
+
+    @patch('posts.timeline.TIMELINE_SIZE', 2)
+    def test_timeline_is_capped(self):
+        Post.objects.bulk_create(
+            Post(author=self.author, text='Тест') for i in range(3))
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        # Каждая публикация сверх лимита вытесняет самую старую запись.
+        post = Post.objects.create(author=self.author, text='Новый')
+        entries = TimelineEntry.objects.filter(user=self.reader)
+        self.assertEqual(entries.count(), 2)
+        self.assertTrue(entries.filter(post=post).exists())
+
+    @patch('posts.timeline.FANOUT_MAX_FOLLOWERS', 0)
+    def test_celebrity_posts_are_pulled(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый')
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+
+class IndexUsageTests(TestCase):
+    """Горячие запросы лент читают индекс, а не всю таблицу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username=FOLLOWER)
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок', slug=SLUG, description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовый текст', group=cls.group)
+        Comment.objects.create(author=cls.reader, post=cls.post, text='Текст')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_feeds_use_indexes(self):
+        client = Client()
+        client.force_login(self.reader)
+        post_detail = reverse('posts:post_detail', args=[self.post.pk])
+        for url in [INDEX, GROUP, PROFILE, FOLLOW, post_detail,
+                    f'{PROFILE}?page=1', f'{GROUP}?page=1']:
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(url)
+                assert_indexed(queries.captured_queries)
+
+    def test_publish_checks_timelines_by_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.create(author=self.author, text='Новый')
+        assert_indexed(queries.captured_queries)
@@ -0,0 +1,342 @@
+"""Фоновая подготовка превью картинок.
+
+sorl-thumbnail режет превью лениво, внутри первого запроса, который
+выводит пост: воркер декодирует и уменьшает оригинал, пока пользователь
+ждёт. BackgroundThumbnailBackend только читает готовые превью из
+хранилища ключей sorl, а при промахе ставит задачу в пул процессов и
+отдаёт заглушку того же размера. Задачи ставятся и при сохранении поста
+с новой картинкой, так что до заглушки обычно не доходит. Картинка
+режется в нескольких ширинах и форматах (VARIANTS), чтобы браузер по
+srcset скачивал не больше, чем нужно экрану.
+
+    THUMBNAIL_BACKEND = 'posts.thumbnails.BackgroundThumbnailBackend'
+
+Каждый {% thumbnail %} спрашивает хранилище ключей, есть ли превью, а
+это обращение к кэшу или БД на каждую картинку. LocalKVStore держит
+найденные записи в LRU внутри процесса:
+
+    THUMBNAIL_KVSTORE = 'posts.thumbnails.LocalKVStore'
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from urllib.parse import quote
+
+import django
+from django.core.cache import cache
+from django.db import transaction
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import DummyImageFile, ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+
+from . import cache as pages
+from .media import source
+from .models import Post
+from .settings import (THUMBNAIL_FORMATS, THUMBNAIL_JOB_TIMEOUT,
+                       THUMBNAIL_LRU_SIZE, THUMBNAIL_LRU_TIMEOUT,
+                       THUMBNAIL_RATIO, THUMBNAIL_SIZES, THUMBNAIL_WIDTHS,
+                       THUMBNAIL_WORKERS)
+
+JOB_KEY = 'posts:thumbnails:job:{}'
+
+logger = logging.getLogger(__name__)
+
+
+def variant(width, image_format=None):
+    """Геометрия и опции sorl для одного варианта картинки."""
+    ratio_width, ratio_height = THUMBNAIL_RATIO
+    options = {'crop': 'center', 'upscale': True}
+    if image_format:
+        options['format'] = image_format
+    return f'{width}x{round(width * ratio_height / ratio_width)}', options
+
+
+FORMATS = tuple(
+    image_format for image_format in THUMBNAIL_FORMATS
+    if image_format is None or features.check(image_format.lower()))
+# {(ширина, формат): (геометрия, опции)} для всех вариантов
+VARIANTS = {
+    (width, image_format): variant(width, image_format)
+    for image_format in FORMATS for width in THUMBNAIL_WIDTHS
+}
+
+_executor = None
+
+
+class LocalKVStore(KVStore):
+    """KVStore sorl с LRU в памяти процесса перед кэшем и БД.
+
+    Запоминаются только найденные записи: промах означает, что превью
+    ещё режется в другом процессе. Записи живут не дольше
+    THUMBNAIL_LRU_TIMEOUT - изменения из других процессов сюда не
+    доходят иначе.
+    """
+
+    def __init__(self, size=THUMBNAIL_LRU_SIZE,
+                 timeout=THUMBNAIL_LRU_TIMEOUT):
+        super().__init__()
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _get_raw(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        value = super()._get_raw(key)
+        if value is not None:
+            self.remember(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self.remember(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self.forget_raw(*keys)
+
+    def remember(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def forget_raw(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def forget(self, image_file):
+        """Убирает из LRU картинку и все её превью."""
+        thumbnails = self._get(image_file.key, identity='thumbnails') or []
+        self.forget_raw(
+            add_prefix(image_file.key),
+            add_prefix(image_file.key, 'thumbnails'),
+            *(add_prefix(key) for key in thumbnails))
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self.entries)}
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
+class Placeholder(DummyImageFile):
+    """Серая картинка нужного размера, пока превью готовится."""
+
+    placeholder = True
+
+    @property
+    def url(self):
+        svg = (f'<svg xmlns="http://www.w3.org/2000/svg" '
+               f'width="{self.x}" height="{self.y}">'
+               f'<rect width="100%" height="100%" fill="#e9ecef"/></svg>')
+        return f'data:image/svg+xml,{quote(svg)}'
+
+
+class ResponsiveImage:
+    """Варианты картинки для <picture>: srcset по форматам и запасной src."""
+
+    sizes = THUMBNAIL_SIZES
+
+    def __init__(self, variants):
+        # variants: {(ширина, формат): превью}
+        self.srcsets = {}
+        for (width, image_format), thumbnail in sorted(
+                variants.items(), key=lambda item: item[0][0]):
+            self.srcsets.setdefault(image_format, []).append(thumbnail)
+        fallback = self.srcsets[None]
+        self.src = fallback[-1].url
+        self.width, self.height = fallback[-1].x, fallback[-1].y
+        self.srcset = self.format_srcset(fallback)
+        self.sources = [
+            {'type': f'image/{image_format.lower()}',
+             'srcset': self.format_srcset(thumbnails)}
+            for image_format, thumbnails in self.srcsets.items()
+            if image_format is not None
+        ]
+
+    @staticmethod
+    def format_srcset(thumbnails):
+        return ', '.join(
+            f'{thumbnail.url} {thumbnail.x}w' for thumbnail in thumbnails)
+
+
+class PlaceholderImage:
+    sizes = srcset = ''
+    sources = ()
+
+    def __init__(self, placeholder):
+        self.src = placeholder.url
+        self.width, self.height = placeholder.x, placeholder.y
+
+
+def responsive(file_):
+    """Все варианты картинки или заглушка, пока хоть один не готов."""
+    variants = {
+        key: default.backend.get_thumbnail(file_, geometry, **options)
+        for key, (geometry, options) in VARIANTS.items()
+    }
+    for thumbnail in variants.values():
+        if isinstance(thumbnail, Placeholder):
+            return PlaceholderImage(Placeholder(
+                VARIANTS[max(THUMBNAIL_WIDTHS), None][0]))
+    return ResponsiveImage(variants)
+
+
+class BackgroundThumbnailBackend(ThumbnailBackend):
+    def get_options(self, source, options):
+        # Те же умолчания, что в ThumbnailBackend.get_thumbnail: от них
+        # зависит имя файла превью.
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_cached(self, file_, geometry_string, **options):
+        """Готовое превью или None, без обращения к оригиналу."""
+        image = ImageFile(file_)
+        name = self._get_thumbnail_filename(
+            image, geometry_string, self.get_options(image, options))
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        thumbnail = self.get_cached(file_, geometry_string, **options)
+        if thumbnail is not None:
+            return thumbnail
+        schedule(ImageFile(file_).name)
+        return Placeholder(geometry_string)
+
+    def generate(self, file_, geometry_string, **options):
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+
+backend = BackgroundThumbnailBackend()
+
+
+def generate(name, force=False):
+    """Режет все варианты картинки. Выполняется в процессе пула.
+
+    force удаляет готовые варианты и кодирует их заново. Если что-то было
+    создано, сбрасывает страницы постов с этой картинкой: в них
+    закэширована заглушка или старые варианты.
+    """
+    created = False
+    image = source(name)
+    try:
+        if force:
+            default.kvstore.delete_thumbnails(image)
+        for geometry, options in VARIANTS.values():
+            if backend.get_cached(image, geometry, **options) is None:
+                backend.generate(image, geometry, **options)
+                created = True
+    finally:
+        cache.delete(JOB_KEY.format(name))
+    if created:
+        posts = list(Post.objects.filter(image=name).values_list(
+            'pk', 'author__username', 'group__slug'))
+        pages.posts_changed({author for _, author, _ in posts},
+                            {slug for _, _, slug in posts},
+                            posts=[pk for pk, _, _ in posts])
+        pages.cards_changed(posts=[pk for pk, _, _ in posts])
+    return created
+
+
+def forget(*names):
+    """Сбрасывает LRU превью для картинок, которые сменились у постов."""
+    if isinstance(default.kvstore, LocalKVStore):
+        for name in filter(None, names):
+            default.kvstore.forget(source(name))
+
+
+class InlineExecutor:
+    """Пул без процессов: задача выполняется сразу при submit."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+def make_executor(workers=None):
+    """Пул процессов; при THUMBNAIL_WORKERS = 0 - InlineExecutor.
+
+    Без пула режут превью тесты: тестовая БД не видна дочерним процессам.
+    """
+    if workers is None:
+        workers = THUMBNAIL_WORKERS
+    if not workers:
+        return InlineExecutor()
+    # spawn, а не fork: дочерний процесс не должен делить с родителем
+    # соединения с БД и кэшем.
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = make_executor()
+    return _executor
+
+
+def log_failure(future):
+    if future.exception() is not None:
+        logger.error('Не удалось подготовить превью',
+                     exc_info=future.exception())
+
+
+def submit(name):
+    # Одна задача на картинку, сколько бы страниц её ни ждали.
+    if not cache.add(JOB_KEY.format(name), 1, THUMBNAIL_JOB_TIMEOUT):
+        return
+    try:
+        get_executor().submit(generate, name).add_done_callback(log_failure)
+    except Exception:
+        cache.delete(JOB_KEY.format(name))
+        raise
+
+
+def schedule(*names):
+    """Ставит подготовку превью после фиксации транзакции."""
+    for name in filter(None, names):
+        transaction.on_commit(lambda name=name: submit(name))
@@ -0,0 +1,157 @@
+"""Материализованная лента подписок.
+
+Новый пост раскладывается по лентам подписчиков автора при публикации,
+поэтому follow_index читает один диапазон индекса вместо join через
+Follow. Авторы с очень большим числом подписчиков (celebrity) не
+раскладываются: их посты подмешиваются при чтении.
+"""
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Subquery
+
+from core.db import bulk_batch_size
+
+from .models import Follow, Post, TimelineEntry, User
+from .pagination import keyset_filter
+from .settings import (CELEBRITY_CACHE_DURATION, FANOUT_BATCH_SIZE,
+                       FANOUT_MAX_FOLLOWERS, TIMELINE_SIZE)
+
+CELEBRITY_CACHE_KEY = 'posts:timeline:celebrities'
+PRUNE_CHECK_BATCH_SIZE = 500
+
+
+def celebrity_ids():
+    """Авторы, для которых fan-out не делается."""
+    ids = cache.get(CELEBRITY_CACHE_KEY)
+    if ids is None:
+        ids = frozenset(
+            Follow.objects.values('author').annotate(
+                followers=Count('id')
+            ).filter(
+                followers__gt=FANOUT_MAX_FOLLOWERS
+            ).values_list('author', flat=True)
+        )
+        cache.set(CELEBRITY_CACHE_KEY, ids, CELEBRITY_CACHE_DURATION)
+    return ids
+
+
+def _bulk_add(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=bulk_batch_size(TimelineEntry, FANOUT_BATCH_SIZE),
+        ignore_conflicts=True)
+
+
+def fan_out(posts):
+    """Раскладывает свежие посты по лентам подписчиков их авторов."""
+    celebrities = celebrity_ids()
+    posts = [post for post in posts if post.author_id not in celebrities]
+    if not posts:
+        return
+    followers = {}
+    for author_id, user_id in Follow.objects.filter(
+            author__in={post.author_id for post in posts}
+    ).values_list('author', 'user').iterator():
+        followers.setdefault(author_id, []).append(user_id)
+    entries = []
+    for post in posts:
+        entries.extend(
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.get(post.author_id, ())
+        )
+    _bulk_add(entries)
+    for user_id in overflowing({entry.user_id for entry in entries}):
+        prune(user_id)
+
+
+def overflowing(user_ids):
+    """Читатели, в лентах которых больше TIMELINE_SIZE записей.
+
+    Для каждого читателя берётся одна запись с позиции TIMELINE_SIZE по
+    индексу (user, -pub_date, -post): лента длиннее лимита, если она есть.
+    Записи дальше этой позиции не читаются.
+    """
+    beyond_limit = TimelineEntry.objects.filter(
+        user=OuterRef('pk')
+    ).order_by('-pub_date', '-post_id').values('post_id')[
+        TIMELINE_SIZE:TIMELINE_SIZE + 1]
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), PRUNE_CHECK_BATCH_SIZE):
+        yield from User.objects.filter(
+            pk__in=user_ids[start:start + PRUNE_CHECK_BATCH_SIZE]
+        ).annotate(
+            beyond_limit=Subquery(beyond_limit)
+        ).filter(
+            beyond_limit__isnull=False
+        ).values_list('pk', flat=True)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя последние посты нового кумира."""
+    if author_id in celebrity_ids():
+        return
+    posts = Post.objects.filter(author=author_id).order_by(
+        '-pub_date', '-id').values_list('id', 'pub_date')[:TIMELINE_SIZE]
+    _bulk_add(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+    prune(user_id)
+
+
+def unfollow(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user=user_id, post__author=author_id).delete()
+
+
+def prune(user_id):
+    """Оставляет в ленте не больше TIMELINE_SIZE самых свежих постов."""
+    entries = TimelineEntry.objects.filter(user=user_id)
+    last_kept = keyset_filter(
+        entries, None, pk_field='post_id'
+    ).values_list('pub_date', 'post_id')[TIMELINE_SIZE - 1:TIMELINE_SIZE]
+    for position in last_kept:
+        keyset_filter(entries, position, pk_field='post_id').delete()
+
+
+def rebuild(user_id):
+    """Собирает ленту читателя заново из его подписок."""
+    TimelineEntry.objects.filter(user=user_id).delete()
+    posts = Post.objects.filter(
+        author__following__user=user_id
+    ).exclude(
+        author__in=celebrity_ids()
+    ).order_by('-pub_date', '-id').values_list(
+        'id', 'pub_date')[:TIMELINE_SIZE]
+    _bulk_add(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+
+
+def follow_feed(user):
+    """fetch-функция для get_keyset_page: лента плюс посты celebrity."""
+    pulled = celebrity_ids()
+    if pulled:
+        pulled = list(Follow.objects.filter(
+            user=user, author__in=pulled).values_list('author', flat=True))
+
+    def fetch(position, reverse, limit):
+        entries = keyset_filter(
+            TimelineEntry.objects.filter(user=user),
+            position, reverse, pk_field='post_id'
+        ).select_related('post__author', 'post__group')[:limit]
+        posts = [entry.post for entry in entries]
+        if not pulled:
+            return posts
+        posts += keyset_filter(
+            Post.objects.filter(author__in=pulled).select_related(
+                'author', 'group'),
+            position, reverse
+        )[:limit]
+        posts = {post.pk: post for post in posts}.values()
+        return sorted(
+            posts,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not reverse
+        )[:limit]
+
+    return fetch
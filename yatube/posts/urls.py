@@ -1,15 +1,24 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
-from . import views
+from core.cache import cache_view, conditional_view
+
+from . import cache, views
+from .settings import FEED_PAGE_CACHE_DURATION, INDEX_PAGE_CACHE_DURATION
 
 app_name = 'posts'
 
 urlpatterns = [
-    path("", cache_page(20)(views.index), name="index"),
-    path("group/<slug:slug>/", views.group_posts, name="group_posts"),
-    path("profile/<str:username>/", views.profile, name="profile"),
-    path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
+    path("", cache_view(INDEX_PAGE_CACHE_DURATION, cache.index_scopes)(
+        views.index), name="index"),
+    path("group/<slug:slug>/", cache_view(
+        FEED_PAGE_CACHE_DURATION, cache.group_scopes)(views.group_posts),
+        name="group_posts"),
+    path("profile/<str:username>/", cache_view(
+        FEED_PAGE_CACHE_DURATION, cache.profile_scopes)(views.profile),
+        name="profile"),
+    path("posts/<int:post_id>/", conditional_view(
+        cache.post_detail_scopes, forms=True)(views.post_detail),
+        name="post_detail"),
     path("posts/<int:post_id>/edit/", views.post_edit, name="post_edit"),
     path("create/", views.post_create, name="post_create"),
     path('posts/<int:post_id>/comment/', views.add_comment,
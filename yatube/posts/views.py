@@ -3,20 +3,29 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, render, redirect
 
 
+from .cache import attach_card_versions
 from .forms import PostForm, CommentForm
 from .models import Post, Group, User, Follow
-from .settings import NUMBER_POSTS
-
-
-def get_page(page_number, posts):
-    paginator = Paginator(posts, NUMBER_POSTS)
-    page_obj = paginator.get_page(page_number)
+from .pagination import get_keyset_page
+from .settings import KEYSET_PAGINATION, NUMBER_POSTS
+from .timeline import follow_feed
+
+
+def get_page(request, posts, fetch=None):
+    # Старые ссылки вида ?page=N продолжают работать через Paginator.
+    page_number = request.GET.get('page')
+    if KEYSET_PAGINATION and page_number is None:
+        page_obj = get_keyset_page(request.GET, fetch or posts)
+    else:
+        paginator = Paginator(posts, NUMBER_POSTS)
+        page_obj = paginator.get_page(page_number)
+    attach_card_versions(page_obj)
     return page_obj
 
 
 def index(request):
-    posts = Post.objects.all()
-    page_obj = get_page(request.GET.get('page'), posts)
+    posts = Post.objects.select_related('author', 'group')
+    page_obj = get_page(request, posts)
     context = {
         'page_obj': page_obj,
     }
@@ -25,8 +34,8 @@ def index(request):
 
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('group').all()
-    page_obj = get_page(request.GET.get('page'), posts)
+    posts = group.posts.select_related('author', 'group')
+    page_obj = get_page(request, posts)
     context = {
         'group': group,
         'page_obj': page_obj
@@ -35,12 +44,13 @@ def group_posts(request, slug):
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
     follow = (request.user.is_authenticated and author != request.user
               and Follow.objects.filter(user=request.user,
                                         author=author).exists())
-    posts = author.posts.all()
-    page_obj = get_page(request.GET.get('page'), posts)
+    posts = author.posts.select_related('author', 'group')
+    page_obj = get_page(request, posts)
     context = {
         'page_obj': page_obj,
         'author': author,
@@ -50,10 +60,12 @@ def profile(request, username):
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id)
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
+        'comments': post.comments.select_related('author'),
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
@@ -109,8 +121,10 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_page(request.GET.get('page'), posts)
+    posts = Post.objects.filter(
+        author__following__user=request.user
+    ).select_related('author', 'group')
+    page_obj = get_page(request, posts, follow_feed(request.user))
     context = {
         'page_obj': page_obj,
     }
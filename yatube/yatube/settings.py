@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -44,10 +45,12 @@ INSTALLED_APPS = [
     'core.context_processors.year',
     'core.templatetags.user_filters',
     'sorl.thumbnail',
-    'api'
+    'rest_framework',
+    'api.apps.ApiConfig',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -148,8 +151,51 @@ ALLOWED_HOSTS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+# Превью режутся в фоновом пуле, шаблоны их только читают.
+THUMBNAIL_BACKEND = 'posts.thumbnails.BackgroundThumbnailBackend'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.LocalKVStore'
+# Один файл на хост: кэш и поколения общие для всех воркеров.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    }
+}
+# Тесты (manage.py test и pytest) чистят кэш и не должны трогать файл
+# разработчика: у каждого процесса свой кэш в памяти.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'yatube-tests',
+        }
     }
+
+# Бюджет на один запрос для core.middleware.QueryTimingMiddleware
+REQUEST_BUDGET = {
+    'QUERIES': 30,
+    'SQL_MS': 200,
+    'TOTAL_MS': 1000,
+    'RAISE': False,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.requests': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api.authentication.CachedJWTAuthentication',
+    ],
 }